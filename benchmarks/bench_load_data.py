@@ -0,0 +1,60 @@
+"""
+Compare utils.load_data backends on a large synthetic result set.
+
+    python benchmarks/bench_load_data.py --rows 1000000 --repeat 3
+
+Runs against the database configured in config/.env. The result set is
+generated server-side with generate_series, so no tables are touched.
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # repo root
+sys.path.insert(0, str(BASE_DIR))
+
+from utils import load_data  # noqa: E402
+
+QUERY = """
+    SELECT
+        g AS order_item_id,
+        'Product ' || (g %% 2000) AS product,
+        (DATE '2024-01-01' + (g %% 365)) AS order_date,
+        (g %% 7)::smallint AS channel_id,
+        round((random() * 500)::numeric, 2) AS revenue_net,
+        (g %% 5) + 1 AS qty
+    FROM generate_series(1, %(rows)s) AS g
+"""
+
+
+def run(backend: str, rows: int):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    df = load_data(QUERY, {"rows": rows}, backend=backend)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, int(df.memory_usage(deep=True).sum()), len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backends", nargs="+", default=["sql", "arrow"])
+    args = parser.parse_args()
+
+    print(f"load_data benchmark: {args.rows:,} rows, best of {args.repeat}")
+    print(f"{'backend':<8} {'seconds':>9} {'peak py MB':>11} {'df MB':>9} {'rows':>10}")
+    for backend in args.backends:
+        results = [run(backend, args.rows) for _ in range(args.repeat)]
+        elapsed, peak, df_bytes, n = min(results)
+        print(f"{backend:<8} {elapsed:>9.2f} {peak / 2**20:>11.1f} {df_bytes / 2**20:>9.1f} {n:>10,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+The LangChain NL -> SQL chat used by chatbox.py: a SQL chain over the pruned
+schema and a chain that runs its SQL and answers in plain language. Kept out
+of the Streamlit page so it can be imported (benchmarks/bench_chat.py).
+"""
+import os
+import json
+import urllib.parse
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnablePassthrough
+from langchain_community.utilities import SQLDatabase
+from langchain_core.output_parsers import StrOutputParser
+from utils import chat_llm
+from schema_retriever import prune_schema
+
+# ============================================================================
+# INIT SUPABASE DATABASE CONNECTION
+# ============================================================================
+def init_supabase() -> SQLDatabase:
+    """
+    Initialize Supabase connection using environment variables and get_db_connection.
+    """
+    user = os.getenv("DB_USER")
+    password = urllib.parse.quote_plus(os.getenv("DB_PASSWORD"))
+    host = os.getenv("DB_HOST")
+    port = os.getenv("DB_PORT")
+    database = os.getenv("DB_NAME")
+    db_uri = f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{database}"
+    return SQLDatabase.from_uri(db_uri)
+
+def load_schema_from_file(path="config/schema.json") -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+# ============================================================================
+# SQL GENERATION CHAIN
+# ============================================================================
+def get_sql_chain(db: SQLDatabase, schema_info: dict):
+    template = """
+    You are a data analyst at a company. You are interacting with a user who is asking you questions about the company's database.
+    Based on the table schema below, write a SQL query that would answer the user's question. 
+    Always use schema-qualified table names in the format schema.table (e.g., wh.dim_product, wh.fact_orders). Never prepend extra letters or aliases to the schema name.
+    Take the conversation history into account.
+    
+    
+    <SCHEMA>{schema}</SCHEMA>
+    
+    Conversation History: {chat_history}
+    
+    Write only the SQL query and nothing else. Do not wrap the SQL query in any other text, not even backticks.
+    No explanation. No formatting. No backticks.
+
+    For example:
+    Question: how many products do I have?
+    SQL Query: SELECT "ArtistId", COUNT(*) as track_count FROM "Track" GROUP BY "ArtistId" ORDER BY track_count DESC LIMIT 3;
+    
+    Question: Name 10 artists
+    SQL Query: SELECT "Name" FROM "Artist" LIMIT 10;
+    
+    Your turn:
+    Question: {question}
+    SQL Query:
+    """
+
+    prompt = ChatPromptTemplate.from_template(template)
+
+    # Use LLaMA 3.2 via OpenAI-compatible endpoint (set in .env as OPENAI_API_KEY + BASE_URL if needed)
+    llm = chat_llm("gemini-1.5-flash", temperature=0)
+
+    return (
+        # only the tables/columns this question needs, not the whole schema
+        RunnablePassthrough.assign(schema=lambda vars: prune_schema(schema_info, vars["question"]))
+        | prompt
+        | llm
+        | StrOutputParser()
+    )
+
+# ============================================================================
+# NATURAL LANGUAGE RESPONSE CHAIN
+# ============================================================================
+def get_response(user_query: str, db: SQLDatabase, schema_info: dict, chat_history: list):
+    sql_chain = get_sql_chain(db, schema_info)
+
+    template = """
+    You are a helpful data analyst. Based on the schema, user question, SQL query, and SQL response,
+    write a clear and concise natural language answer.
+
+    <SCHEMA>{schema}</SCHEMA>
+    Conversation History: {chat_history}
+    SQL Query: <SQL>{query}</SQL>
+    User question: {question}
+    SQL Response: {response}
+    """
+
+    prompt = ChatPromptTemplate.from_template(template)
+
+    llm = chat_llm("gemini-1.5-flash", temperature=0)
+    chain = (
+        RunnablePassthrough.assign(query=sql_chain).assign(
+            schema=lambda vars: prune_schema(schema_info, vars["question"]),
+            response=lambda vars: db.run(vars["query"]),
+        )
+        | prompt
+        | llm
+        | StrOutputParser()
+    )
+    return chain.invoke({
+        "question": user_query,
+        "chat_history": chat_history,
+    })
@@ -0,0 +1,199 @@
+"""
+Tracing for the chat pipeline: one trace per chat request (request id), one
+span per stage, appended to a local JSONL sink when the request ends.
+
+    python chat_trace.py                # p50 / p95 per stage over logs/chat_traces.jsonl
+    python chat_trace.py --last 200
+
+Span lines use OpenTelemetry field names (trace_id, span_id, parent_span_id,
+start/end_time_unix_nano, attributes, status) so they can be forwarded to an
+OTLP collector later; no SDK is needed to write them.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TRACE_LOG = os.getenv("CHAT_TRACE_LOG", "logs/chat_traces.jsonl")
+TRACE_ENABLED = os.getenv("CHAT_TRACE", "1") != "0"
+
+_write_lock = threading.Lock()  # Streamlit sessions share the sink
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class ChatTrace:
+    """
+    Spans of one chat request. The root span starts here and ends with end()
+    (stream_response calls it once the answer has streamed, or on failure);
+    then every span is written to TRACE_LOG. A disabled trace is a no-op.
+    """
+
+    def __init__(self, name: str = "chat", request_id: str = None, enabled: bool = None, **attributes):
+        self.enabled = TRACE_ENABLED if enabled is None else enabled
+        self.request_id = request_id or new_request_id()
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []  # finished spans
+        self._stack = []  # open spans, root first
+        self._ended = False
+        self._root = self._open(name, attributes)
+
+    def _open(self, name: str, attributes: dict) -> dict:
+        span = {
+            "name": name,
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_span_id": self._stack[-1]["span_id"] if self._stack else None,
+            "start_time_unix_nano": time.time_ns(),
+            "attributes": dict(attributes),
+            "status": "ok",
+            "_started": time.perf_counter(),
+        }
+        self._stack.append(span)
+        return span
+
+    def _close(self, span: dict, error: BaseException = None):
+        duration_ms = (time.perf_counter() - span.pop("_started")) * 1000
+        span["duration_ms"] = round(duration_ms, 1)
+        span["end_time_unix_nano"] = span["start_time_unix_nano"] + int(duration_ms * 1_000_000)
+        if error is not None:
+            span["status"] = "error"
+            span["error"] = f"{type(error).__name__}: {error}"
+        self._stack.remove(span)
+        self.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Times the block as a child of the innermost open span; yields its
+        attributes dict so results (rows, tokens, ...) can be added to it.
+        """
+        if not self.enabled or self._ended:
+            yield dict(attributes)
+            return
+        span = self._open(name, attributes)
+        error = None
+        try:
+            yield span["attributes"]
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._close(span, error)
+
+    def annotate(self, **attributes):
+        """Add attributes to the root span (route, refused, ...)."""
+        self._root["attributes"].update(attributes)
+
+    def stream(self, chunks):
+        """Yields the answer chunks, ending the trace once they are exhausted (or fail)."""
+        error = None
+        try:
+            yield from chunks
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.end(error)
+
+    def end(self, error: BaseException = None, **attributes):
+        """Close any open spans (root last) and write the trace; later calls do nothing."""
+        if self._ended:
+            return
+        self._ended = True
+        self.annotate(**attributes)
+        while self._stack:
+            span = self._stack[-1]
+            self._close(span, error if span is self._root else None)
+        if not self.enabled:
+            return
+
+        stages = ", ".join(
+            f"{s['name']} {s['duration_ms']:.0f}" for s in self.spans
+            if s["parent_span_id"] == self._root["span_id"]
+        )
+        logger.info("chat %s: %.0f ms (%s)", self.request_id, self._root["duration_ms"], stages)
+        try:
+            write_spans(self.request_id, self.trace_id, self.spans)
+        except OSError as e:
+            logger.warning("Could not write chat trace %s: %s", self.request_id, e)
+
+
+NULL_TRACE = ChatTrace("untraced", enabled=False)  # default for functions called outside a request
+
+
+def write_spans(request_id: str, trace_id: str, spans: list, path: str = None):
+    path = path or TRACE_LOG
+    lines = "".join(
+        json.dumps({"request_id": request_id, "trace_id": trace_id, **span}, default=str) + "\n"
+        for span in spans
+    )
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _write_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(lines)
+
+
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def stage_stats(path: str = None, last: int = None) -> list:
+    """
+    [{"stage", "count", "p50_ms", "p95_ms", "max_ms", "errors"}] over the
+    last `last` requests in the trace log, slowest p95 first.
+    """
+    path = path or TRACE_LOG
+    if not os.path.exists(path):
+        return []
+    by_request = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            span = json.loads(line)
+            by_request.setdefault(span["request_id"], []).append(span)
+    requests = list(by_request.values())[-last:] if last else by_request.values()
+
+    durations, errors = {}, {}
+    for spans in requests:
+        for span in spans:
+            durations.setdefault(span["name"], []).append(span["duration_ms"])
+            errors[span["name"]] = errors.get(span["name"], 0) + (span["status"] == "error")
+    stats = [
+        {
+            "stage": name,
+            "count": len(values),
+            "p50_ms": _percentile(values, 0.5),
+            "p95_ms": _percentile(values, 0.95),
+            "max_ms": max(values),
+            "errors": errors[name],
+        }
+        for name, values in durations.items()
+    ]
+    return sorted(stats, key=lambda s: -s["p95_ms"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=TRACE_LOG)
+    parser.add_argument("--last", type=int, help="only the most recent N requests")
+    args = parser.parse_args()
+
+    stats = stage_stats(args.log, args.last)
+    if not stats:
+        print(f"No chat traces in {args.log}")
+        return
+    print(f"{'stage':<22} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'errors':>7}")
+    for s in stats:
+        print(f"{s['stage']:<22} {s['count']:>6} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} "
+              f"{s['max_ms']:>9.1f} {s['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,7 @@
 import os
-import urllib.parse
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_community.utilities import SQLDatabase
-from langchain_core.output_parsers import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
+from chat_chain import init_supabase, load_schema_from_file, get_response
 import plotly.express as px
 import streamlit as st
 import pandas as pd
@@ -33,105 +28,6 @@ def load_data(query, params=None):
     conn.close()
     return df
 
-def init_supabase() -> SQLDatabase:
-    """
-    Initialize Supabase connection using environment variables and get_db_connection.
-    """
-    user = os.getenv("DB_USER")
-    password = urllib.parse.quote_plus(os.getenv("DB_PASSWORD"))
-    host = os.getenv("DB_HOST")
-    port = os.getenv("DB_PORT")
-    database = os.getenv("DB_NAME")
-    db_uri = f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{database}"
-    return SQLDatabase.from_uri(db_uri)
-
-def load_schema_from_file(path="config/schema.sql") -> str:
-    with open(path, "r") as f:
-        return f.read()
-# ============================================================================
-# SQL GENERATION CHAIN
-# ============================================================================
-def get_sql_chain(db: SQLDatabase, schema: str):
-    template = """
-    You are a data analyst at a company. You are interacting with a user who is asking you questions about the company's database.
-    Based on the table schema below, write a SQL query that would answer the user's question. 
-    Always use schema-qualified table names in the format schema.table (e.g., wh.dim_product, wh.fact_orders). Never prepend extra letters or aliases to the schema name.
-    Take the conversation history into account.
-    
-    
-    <SCHEMA>{schema}</SCHEMA>
-    
-    Conversation History: {chat_history}
-    
-    Write only the SQL query and nothing else. Do not wrap the SQL query in any other text, not even backticks.
-    No explanation. No formatting. No backticks.
-
-    For example:
-    Question: how many products do I have?
-    SQL Query: SELECT "ArtistId", COUNT(*) as track_count FROM "Track" GROUP BY "ArtistId" ORDER BY track_count DESC LIMIT 3;
-    
-    Question: Name 10 artists
-    SQL Query: SELECT "Name" FROM "Artist" LIMIT 10;
-    
-    Your turn:
-    Question: {question}
-    SQL Query:
-    """
-
-    prompt = ChatPromptTemplate.from_template(template)
-
-    # Use LLaMA 3.2 via OpenAI-compatible endpoint (set in .env as OPENAI_API_KEY + BASE_URL if needed)
-    llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash", 
-    google_api_key=os.getenv("GEMINI_API_KEY"),  # make sure this matches your .env variable name
-    temperature=0
-)
-
-    return (
-        RunnablePassthrough.assign(schema=lambda _: schema)
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
-
-# ============================================================================
-# NATURAL LANGUAGE RESPONSE CHAIN
-# ============================================================================
-def get_response(user_query: str, db: SQLDatabase, schema: str, chat_history: list):
-    sql_chain = get_sql_chain(db, schema)
-
-    template = """
-    You are a helpful data analyst. Based on the schema, user question, SQL query, and SQL response,
-    write a clear and concise natural language answer.
-
-    <SCHEMA>{schema}</SCHEMA>
-    Conversation History: {chat_history}
-    SQL Query: <SQL>{query}</SQL>
-    User question: {question}
-    SQL Response: {response}
-    """
-
-    prompt = ChatPromptTemplate.from_template(template)
-
-    llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash", 
-    google_api_key=os.getenv("GEMINI_API_KEY"),  # make sure this matches your .env variable name
-    temperature=0
-)
-    chain = (
-        RunnablePassthrough.assign(query=sql_chain).assign(
-            schema=lambda _: schema,
-            response=lambda vars: db.run(vars["query"]),
-        )
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
-    return chain.invoke({
-        "question": user_query,
-        "chat_history": chat_history,
-    })
-
 # ============================================================================
 # STREAMLIT APP
 # ============================================================================
@@ -181,28 +77,28 @@ if page == "📊 KPI Dashboard":
     revenue_df = load_data("""
         SELECT SUM(order_total_gross) as revenue 
         FROM wh.fact_orders o
-        WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s;
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s;
     """, date_params)
     col1.metric("Total Revenue", f"RM{revenue_df['revenue'][0]:,.2f}")
 
     orders_df = load_data("""
         SELECT COUNT(*) as orders 
         FROM wh.fact_orders o
-        WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s;
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s;
     """, date_params)
     col2.metric("Total Orders", f"{orders_df['orders'][0]:,}")
 
     customers_df = load_data("""
         SELECT COUNT(DISTINCT customer_sk) as customers 
         FROM wh.fact_orders o
-        WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s;
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s;
     """, date_params)
     col3.metric("Customers", f"{customers_df['customers'][0]:,}")
 
     aov_df = load_data("""
         SELECT SUM(order_total_gross)/COUNT(*) as avg_order
         FROM wh.fact_orders o
-        WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s;
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s;
     """, date_params)
     col4.metric("Avg Order Value", f"RM{aov_df['avg_order'][0]:,.2f}")
 
@@ -211,9 +107,9 @@ if page == "📊 KPI Dashboard":
     # -----------------------------
     st.subheader("📈 Revenue Trend")
     trend_df = load_data("""
-        SELECT order_ts::date as order_date, SUM(order_total_gross) as revenue
+        SELECT order_date, SUM(order_total_gross) as revenue
         FROM wh.fact_orders
-        WHERE order_ts::date BETWEEN %(start_date)s AND %(end_date)s
+        WHERE order_date BETWEEN %(start_date)s AND %(end_date)s
         GROUP BY order_date
         ORDER BY order_date;
     """, date_params)
@@ -228,7 +124,7 @@ if page == "📊 KPI Dashboard":
         SELECT c.name as channel, SUM(o.order_total_gross) as revenue
         FROM wh.fact_orders o
         JOIN wh.dim_channel c ON o.channel_id = c.channel_id
-        WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s
         GROUP BY c.name;
     """, date_params)
     fig = px.pie(channel_df, names="channel", values="revenue", title="Revenue Share by Channel")
@@ -245,7 +141,7 @@ if page == "📊 KPI Dashboard":
         FROM wh.fact_order_items oi
         JOIN wh.dim_product p ON oi.product_sk = p.product_sk
         JOIN wh.fact_orders o ON oi.order_sk = o.order_sk
-        WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s
         GROUP BY p.name
         ORDER BY revenue DESC
         LIMIT 10;
@@ -277,7 +173,7 @@ elif page == "💬 Chat with AI":
     if "db" not in st.session_state:
         st.session_state.db = init_supabase()
     if "schema_info" not in st.session_state:
-        st.session_state.schema_info = load_schema_from_file("config/schema.sql")
+        st.session_state.schema_info = load_schema_from_file("config/schema.json")
 
     # # --- DEBUG: Print schema structure ---
     # st.subheader("Database Schema (for debugging)")
@@ -0,0 +1,370 @@
+import math
+import os
+
+# ============================================================================
+# DASHBOARD QUERY LAYER
+# SQL builders for the KPI dashboard. Each returns (sql, params) ready for
+# utils.load_data, so the heavy lifting (grouping, ranking) stays in Postgres.
+#
+# Date filters use wh.fact_orders.order_date, the indexed Malaysia-local
+# calendar date maintained by the ETL (mapping.ensure_local_date_columns),
+# never order_ts::date, which defeats indexes and uses the session timezone.
+# ============================================================================
+TOP_N = int(os.getenv("DASHBOARD_TOP_N", 10))
+OTHERS_LABEL = "Others"  # bound as a parameter; the is_other column tells the bucket from a real "Others"
+
+# ============================================================================
+# FILTERS (channel / category / brand / store / region, pushed into WHERE)
+# ============================================================================
+# filters: {dimension: [values]}; empty or missing dimensions are not filtered.
+# Each dimension is a subquery on its (small) dim table, so the fact scan keeps
+# using the order_date index. Values are always bound parameters.
+FILTER_DIMENSIONS = {
+    "channel": "SELECT name FROM wh.dim_channel",
+    "category": "SELECT category FROM wh.dim_product",
+    "brand": "SELECT brand FROM wh.dim_product",
+    "store": "SELECT name FROM wh.dim_store",
+    "region": "SELECT region FROM wh.dim_customer",
+}
+PRODUCT_FILTERS = ("category", "brand")
+
+_ORDER_CONDITIONS = {
+    "channel": "o.channel_id IN (SELECT channel_id FROM wh.dim_channel WHERE name = ANY(%(f_channel)s))",
+    "store": "o.store_sk IN (SELECT store_sk FROM wh.dim_store WHERE name = ANY(%(f_store)s))",
+    "region": "o.customer_sk IN (SELECT customer_sk FROM wh.dim_customer WHERE region = ANY(%(f_region)s))",
+}
+
+
+def _active(filters: dict) -> dict:
+    filters = {k: list(v) for k, v in (filters or {}).items() if v}
+    unknown = set(filters) - set(FILTER_DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown filter(s) {sorted(unknown)}. Expected some of {sorted(FILTER_DIMENSIONS)}")
+    return filters
+
+
+def filter_params(filters: dict) -> dict:
+    return {f"f_{k}": v for k, v in _active(filters).items()}
+
+
+def product_filter_params(filters: dict) -> dict:
+    return {f"f_{k}": v for k, v in _active(filters).items() if k in PRODUCT_FILTERS}
+
+
+def order_filter_sql(filters: dict) -> str:
+    """
+    ' AND ...' conditions on wh.fact_orders o. Product filters keep orders that
+    contain at least one matching item (order totals are not split per item).
+    """
+    conditions = []
+    for dim in _active(filters):
+        if dim in PRODUCT_FILTERS:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM wh.fact_order_items fi JOIN wh.dim_product fp ON fp.product_sk = fi.product_sk"
+                f" WHERE fi.order_sk = o.order_sk AND fp.{dim} = ANY(%(f_{dim})s))"
+            )
+        else:
+            conditions.append(_ORDER_CONDITIONS[dim])
+    return "".join(f"\n          AND {c}" for c in conditions)
+
+
+def item_filter_sql(filters: dict) -> str:
+    """' AND ...' conditions on wh.fact_order_items oi JOIN wh.fact_orders o; product filters match items."""
+    conditions = []
+    for dim in _active(filters):
+        if dim in PRODUCT_FILTERS:
+            conditions.append(f"oi.product_sk IN (SELECT product_sk FROM wh.dim_product WHERE {dim} = ANY(%(f_{dim})s))")
+        else:
+            conditions.append(_ORDER_CONDITIONS[dim])
+    return "".join(f"\n          AND {c}" for c in conditions)
+
+
+def product_filter_sql(filters: dict, alias: str = "p") -> str:
+    """' AND ...' conditions on wh.dim_product; only category and brand apply to product-level data."""
+    return "".join(
+        f"\n          AND {alias}.{dim} = ANY(%(f_{dim})s)" for dim in _active(filters) if dim in PRODUCT_FILTERS
+    )
+
+
+def filter_options():
+    """Distinct values per filter dimension. Columns: dimension, value"""
+    sql = "\n        UNION ALL\n".join(
+        f"""        SELECT DISTINCT '{dim}' AS dimension, v.value
+        FROM ({query}) AS v(value)
+        WHERE v.value IS NOT NULL AND v.value <> ''"""
+        for dim, query in FILTER_DIMENSIONS.items()
+    )
+    return sql + "\n        ORDER BY 1, 2;", None
+
+
+def kpis(date_params: dict, filters: dict = None):
+    """Headline KPIs in one pass. Columns: revenue, orders, customers, avg_order"""
+    sql = f"""
+        SELECT
+            COALESCE(SUM(o.order_total_gross), 0) AS revenue,
+            COUNT(*) AS orders,
+            COUNT(DISTINCT o.customer_sk) AS customers,
+            COALESCE(SUM(o.order_total_gross) / NULLIF(COUNT(*), 0), 0) AS avg_order
+        FROM wh.fact_orders o
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s{order_filter_sql(filters)};
+    """
+    return sql, {**date_params, **filter_params(filters)}
+
+
+def channel_revenue(date_params: dict, filters: dict = None):
+    """Gross revenue per channel. Columns: channel, revenue"""
+    sql = f"""
+        SELECT c.name AS channel, SUM(o.order_total_gross) AS revenue
+        FROM wh.fact_orders o
+        JOIN wh.dim_channel c ON o.channel_id = c.channel_id
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s{order_filter_sql(filters)}
+        GROUP BY c.name;
+    """
+    return sql, {**date_params, **filter_params(filters)}
+
+
+def inventory_health(filters: dict = None):
+    """
+    Current stock per product, lowest cover first, from wh.current_inventory
+    (refreshed by the ETL, decremented in place by the POS server). Only the
+    category and brand filters apply. Columns: master_product_code, product,
+    stock_qty, days_of_cover, last_movement_at
+    """
+    sql = f"""
+        SELECT
+            p.master_product_code,
+            p.name AS product,
+            ci.stock_qty,
+            round(ci.days_of_cover, 1) AS days_of_cover,
+            ci.last_movement_at
+        FROM wh.current_inventory ci
+        JOIN wh.dim_product p ON ci.product_sk = p.product_sk
+        WHERE TRUE{product_filter_sql(filters)}
+        ORDER BY ci.days_of_cover ASC NULLS LAST, ci.stock_qty ASC;
+    """
+    return sql, product_filter_params(filters) or None
+
+
+def inventory_by_category(filters: dict = None):
+    """Current stock per category (category and brand filters apply). Columns: category, stock_qty"""
+    sql = f"""
+        SELECT p.category AS category, SUM(ci.stock_qty) AS stock_qty
+        FROM wh.current_inventory ci
+        JOIN wh.dim_product p ON ci.product_sk = p.product_sk
+        WHERE TRUE{product_filter_sql(filters)}
+        GROUP BY p.category
+        ORDER BY stock_qty DESC;
+    """
+    return sql, product_filter_params(filters) or None
+
+
+def region_sales(date_params: dict, filters: dict = None):
+    """
+    Net revenue in range and customer base per region. total_customers is
+    always every customer in the region (wh.agg_region_customers, see
+    mapping.refresh_region_aggregates), whatever the dates or filters, so
+    filtering only changes the revenue. Unfiltered (or region-only) revenue
+    comes from wh.agg_region_daily; any other filter needs order-level
+    detail, so it is summed from the facts.
+    Columns: region, total_revenue, total_customers
+    """
+    active = _active(filters)
+    params = {**date_params, **filter_params(filters)}
+    region_sql = "\n        WHERE rc.region = ANY(%(f_region)s)" if "region" in active else ""
+    if set(active) <= {"region"}:
+        sql = f"""
+        SELECT
+            rc.region,
+            COALESCE(SUM(a.revenue_net), 0) AS total_revenue,
+            rc.total_customers
+        FROM wh.agg_region_customers rc
+        LEFT JOIN wh.agg_region_daily a
+          ON a.region = rc.region
+         AND a.order_date BETWEEN %(start_date)s AND %(end_date)s{region_sql}
+        GROUP BY rc.region, rc.total_customers;
+    """
+        return sql, params
+
+    sql = f"""
+        WITH sales AS (
+            SELECT
+                COALESCE(NULLIF(c.region, ''), 'Unknown') AS region,
+                SUM(o.order_total_net) AS total_revenue
+            FROM wh.fact_orders o
+            JOIN wh.dim_customer c ON c.customer_sk = o.customer_sk
+            WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s{order_filter_sql(filters)}
+            GROUP BY 1
+        )
+        SELECT
+            rc.region,
+            COALESCE(s.total_revenue, 0) AS total_revenue,
+            rc.total_customers
+        FROM wh.agg_region_customers rc
+        LEFT JOIN sales s ON s.region = rc.region{region_sql};
+    """
+    return sql, params
+
+def region_revenue(date_params: dict, filters: dict = None):
+    """Gross revenue per customer region, highest first. Columns: region, revenue, orders"""
+    sql = f"""
+        SELECT
+            COALESCE(c.region, 'Unknown') AS region,
+            SUM(o.order_total_gross) AS revenue,
+            COUNT(*) AS orders
+        FROM wh.fact_orders o
+        JOIN wh.dim_customer c ON c.customer_sk = o.customer_sk
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s{order_filter_sql(filters)}
+        GROUP BY 1
+        ORDER BY revenue DESC;
+    """
+    return sql, {**date_params, **filter_params(filters)}
+
+# ============================================================================
+# TIME BUCKETING (keeps trend charts under a fixed number of points per series)
+# ============================================================================
+MAX_POINTS_PER_SERIES = int(os.getenv("DASHBOARD_MAX_POINTS", 120))
+
+# Postgres date_trunc field -> approximate length in days, finest first
+TIME_BUCKETS = {"day": 1, "week": 7, "month": 30.44, "quarter": 91.31, "year": 365.25}
+
+
+def pick_time_bucket(start_date, end_date, max_points: int = MAX_POINTS_PER_SERIES) -> str:
+    """Finest date_trunc bucket that keeps a series over [start_date, end_date] within max_points."""
+    days = (end_date - start_date).days + 1
+    for bucket, size in TIME_BUCKETS.items():
+        if math.ceil(days / size) <= max_points:
+            return bucket
+    return "year"
+
+
+def _bucket_params(date_params: dict, bucket: str) -> dict:
+    if bucket not in TIME_BUCKETS:
+        raise ValueError(f"Unknown time bucket '{bucket}'. Expected one of {list(TIME_BUCKETS)}")
+    return {**date_params, "bucket": bucket}
+
+
+def revenue_trend(date_params: dict, bucket: str = "day", filters: dict = None):
+    """Gross revenue per time bucket. Columns: order_date (bucket start), revenue"""
+    sql = f"""
+        SELECT date_trunc(%(bucket)s, o.order_date)::date AS order_date, SUM(o.order_total_gross) AS revenue
+        FROM wh.fact_orders o
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s{order_filter_sql(filters)}
+        GROUP BY 1
+        ORDER BY 1;
+    """
+    return sql, {**_bucket_params(date_params, bucket), **filter_params(filters)}
+
+
+def channel_revenue_trend(date_params: dict, bucket: str = "day", filters: dict = None):
+    """Gross revenue per time bucket and channel. Columns: order_date, channel, revenue"""
+    sql = f"""
+        SELECT date_trunc(%(bucket)s, o.order_date)::date AS order_date, c.name AS channel, SUM(o.order_total_gross) AS revenue
+        FROM wh.fact_orders o
+        JOIN wh.dim_channel c ON o.channel_id = c.channel_id
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s{order_filter_sql(filters)}
+        GROUP BY 1, 2
+        ORDER BY 1;
+    """
+    return sql, {**_bucket_params(date_params, bucket), **filter_params(filters)}
+
+
+# ============================================================================
+# TOP-N + OTHERS (bounded number of series for high-cardinality dimensions)
+# ============================================================================
+# Dimension -> SQL expression and the joins it needs on top of
+# wh.fact_order_items oi JOIN wh.fact_orders o
+TOP_N_DIMENSIONS = {
+    "product": {
+        "expr": "p.name",
+        "joins": "JOIN wh.dim_product p ON oi.product_sk = p.product_sk",
+    },
+    "category": {
+        "expr": "p.category",
+        "joins": "JOIN wh.dim_product p ON oi.product_sk = p.product_sk",
+    },
+    "region": {
+        "expr": "c.region",
+        "joins": "LEFT JOIN wh.dim_customer c ON o.customer_sk = c.customer_sk",
+    },
+}
+
+
+def _dimension(dimension: str) -> dict:
+    if dimension not in TOP_N_DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{dimension}'. Expected one of {sorted(TOP_N_DIMENSIONS)}")
+    return TOP_N_DIMENSIONS[dimension]
+
+
+def top_n_daily_sales(dimension: str, date_params: dict, top_n: int = TOP_N, bucket: str = "day", filters: dict = None):
+    """
+    Net sales per time bucket and dimension value, keeping the top_n values
+    by total sales and folding everything else into a single 'Others' series.
+    Columns: order_date (bucket start), <dimension>, daily_sales, is_other
+    """
+    dim = _dimension(dimension)
+    sql = f"""
+        WITH base AS (
+            SELECT
+                date_trunc(%(bucket)s, o.order_date)::date AS order_date,
+                COALESCE({dim["expr"]}, 'Unknown') AS {dimension},
+                SUM(oi.revenue_net) AS daily_sales
+            FROM wh.fact_order_items oi
+            JOIN wh.fact_orders o ON oi.order_sk = o.order_sk
+            {dim["joins"]}
+            WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s{item_filter_sql(filters)}
+            GROUP BY 1, 2
+        ),
+        top AS (
+            SELECT {dimension}
+            FROM base
+            GROUP BY {dimension}
+            ORDER BY SUM(daily_sales) DESC, {dimension}
+            LIMIT %(top_n)s
+        )
+        SELECT
+            b.order_date,
+            CASE WHEN t.{dimension} IS NULL THEN %(others_label)s ELSE b.{dimension} END AS {dimension},
+            SUM(b.daily_sales) AS daily_sales,
+            t.{dimension} IS NULL AS is_other
+        FROM base b
+        LEFT JOIN top t ON t.{dimension} = b.{dimension}
+        GROUP BY 1, 2, 4
+        ORDER BY 1, 3 DESC;
+    """
+    return sql, {
+        **_bucket_params(date_params, bucket), **filter_params(filters), "top_n": top_n, "others_label": OTHERS_LABEL,
+    }
+
+
+def top_n_sales(dimension: str, date_params: dict, top_n: int = TOP_N, filters: dict = None):
+    """
+    Total net sales per dimension value for the top_n values, plus one
+    'Others' row carrying the remainder (omitted when there is none).
+    Columns: <dimension>, revenue, is_other
+    """
+    dim = _dimension(dimension)
+    sql = f"""
+        WITH base AS (
+            SELECT
+                COALESCE({dim["expr"]}, 'Unknown') AS {dimension},
+                SUM(oi.revenue_net) AS revenue
+            FROM wh.fact_order_items oi
+            JOIN wh.fact_orders o ON oi.order_sk = o.order_sk
+            {dim["joins"]}
+            WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s{item_filter_sql(filters)}
+            GROUP BY 1
+        ),
+        ranked AS (
+            SELECT {dimension}, revenue,
+                   ROW_NUMBER() OVER (ORDER BY revenue DESC, {dimension}) AS rn
+            FROM base
+        )
+        SELECT
+            CASE WHEN rn <= %(top_n)s THEN {dimension} ELSE %(others_label)s END AS {dimension},
+            SUM(revenue) AS revenue,
+            rn > %(top_n)s AS is_other
+        FROM ranked
+        GROUP BY 1, 3
+        ORDER BY MIN(rn);
+    """
+    return sql, {**date_params, **filter_params(filters), "top_n": top_n, "others_label": OTHERS_LABEL}
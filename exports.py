@@ -0,0 +1,270 @@
+"""
+Streaming CSV / Parquet export of warehouse datasets.
+
+    python exports.py order_items --start-date 2025-01-01 --end-date 2025-12-31 --format parquet
+    python exports.py channel_revenue --start-date 2025-01-01 --end-date 2025-01-31 --out channels.csv
+
+Rows are read through a server-side (named) cursor EXPORT_CHUNK_ROWS at a
+time and written chunk by chunk (one Parquet row group per chunk), so memory
+stays flat however many rows the slice holds. The same generators back the
+/api/dashboard/export endpoint in webapp/dashboard_api.py.
+"""
+import argparse
+import csv
+import io
+import os
+import uuid
+from datetime import date
+from decimal import Context, Decimal, InvalidOperation, ROUND_HALF_EVEN
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import dashboard_queries as dq
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 50_000))
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+# ============================================================================
+# DATASETS (name -> builder(date_params) returning (sql, params))
+# ============================================================================
+def order_slice(date_params: dict):
+    """Order headers in a local order_date range."""
+    sql = """
+        SELECT
+            o.order_sk, o.order_id, ch.name AS channel, s.store_id,
+            o.customer_sk, o.order_ts, o.order_date, o.status, o.currency_native,
+            o.order_total_gross, o.order_total_net, o.shipping_fee, o.tax_total, o.voucher_amount
+        FROM wh.fact_orders o
+        JOIN wh.dim_channel ch ON ch.channel_id = o.channel_id
+        LEFT JOIN wh.dim_store s ON s.store_sk = o.store_sk
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s
+        ORDER BY o.order_date, o.order_sk
+    """
+    return sql, dict(date_params)
+
+
+def order_item_slice(date_params: dict):
+    """Order lines with product attributes in a local order_date range."""
+    sql = """
+        SELECT
+            o.order_id, o.order_date, ch.name AS channel,
+            p.master_product_code, p.name AS product, p.category, p.brand,
+            oi.qty, oi.price, oi.discount, oi.revenue_net, oi.cost, oi.margin
+        FROM wh.fact_order_items oi
+        JOIN wh.fact_orders o ON o.order_sk = oi.order_sk
+        JOIN wh.dim_channel ch ON ch.channel_id = o.channel_id
+        JOIN wh.dim_product p ON p.product_sk = oi.product_sk
+        WHERE o.order_date BETWEEN %(start_date)s AND %(end_date)s
+        ORDER BY o.order_date, o.order_sk
+    """
+    return sql, dict(date_params)
+
+
+DATASETS = {
+    "orders": order_slice,
+    "order_items": order_item_slice,
+    "kpis": dq.kpis,
+    "channel_revenue": dq.channel_revenue,
+    "revenue_trend": dq.revenue_trend,
+    "channel_revenue_trend": dq.channel_revenue_trend,
+    "top_products": lambda p: dq.top_n_sales("product", p),
+    "category_sales": lambda p: dq.top_n_daily_sales("category", p),
+    "product_sales": lambda p: dq.top_n_daily_sales("product", p),
+    "inventory_health": lambda p: dq.inventory_health(),
+    "inventory_by_category": lambda p: dq.inventory_by_category(),
+    "region_sales": dq.region_sales,
+}
+
+
+def dataset_query(name: str, date_params: dict):
+    if name not in DATASETS:
+        raise ValueError(f"Unknown dataset '{name}'. Expected one of {sorted(DATASETS)}")
+    return DATASETS[name](date_params)
+
+# ============================================================================
+# SERVER-SIDE CURSOR STREAMING
+# ============================================================================
+def iter_row_chunks(conn, sql: str, params=None, chunk_rows: int = None):
+    """
+    Yields (description, rows) per chunk from a named cursor; an empty result
+    yields one (description, []) so writers can still emit the header/schema.
+    Runs in its own transaction (named cursors need one) and restores the
+    connection after.
+    """
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    try:
+        with conn.cursor(name=f"export_{uuid.uuid4().hex}") as cur:
+            cur.itersize = chunk_rows
+            cur.execute(sql.strip().rstrip(";"), params)
+            first = True
+            while True:
+                rows = cur.fetchmany(chunk_rows)
+                if rows or first:
+                    yield cur.description, rows
+                if not rows:
+                    break
+                first = False
+    finally:
+        conn.rollback()
+        conn.autocommit = autocommit
+
+
+def iter_csv(conn, sql: str, params=None, chunk_rows: int = None):
+    """CSV bytes, header first, one block per cursor chunk."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    header_written = False
+    for description, rows in iter_row_chunks(conn, sql, params, chunk_rows):
+        if not header_written:
+            writer.writerow([c.name for c in description])
+            header_written = True
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+
+# Postgres type OID -> Arrow type; anything else is written as text.
+# numeric is handled by _numeric_type so money columns stay exact.
+PG_NUMERIC = 1700
+PG_ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(), 21: pa.int16(), 23: pa.int32(),
+    700: pa.float32(), 701: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC"),
+}
+
+
+# Unconstrained numeric (every warehouse money column and SUM() result) has
+# no declared scale; it is exported at a fixed one, which fits any amount
+# below 10**32.
+NUMERIC_DEFAULT_TYPE = pa.decimal128(38, 6)
+
+
+def _numeric_type(column) -> pa.DataType:
+    """
+    numeric(p, s) -> decimal128(p, s); unconstrained numeric ->
+    NUMERIC_DEFAULT_TYPE. Only a declared precision above 38, which no
+    Arrow decimal128 can hold, is written as exact decimal text.
+    """
+    if not column.precision:
+        return NUMERIC_DEFAULT_TYPE
+    if column.precision <= 38:
+        return pa.decimal128(column.precision, column.scale or 0)
+    return pa.string()
+
+
+def arrow_schema(description) -> pa.Schema:
+    return pa.schema([
+        (c.name, _numeric_type(c) if c.type_code == PG_NUMERIC else PG_ARROW_TYPES.get(c.type_code, pa.string()))
+        for c in description
+    ])
+
+
+def _to_arrow_value(value, arrow_type):
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        if pa.types.is_string(arrow_type):
+            return format(value, "f")
+        if pa.types.is_decimal(arrow_type):
+            try:
+                return value.quantize(Decimal(1).scaleb(-arrow_type.scale), rounding=ROUND_HALF_EVEN,
+                                      context=Context(prec=arrow_type.precision))
+            except InvalidOperation:
+                raise ValueError(f"{value} does not fit the export type {arrow_type}") from None
+    if pa.types.is_string(arrow_type) and not isinstance(value, str):
+        return value.isoformat() if isinstance(value, date) else str(value)
+    return value
+
+
+def rows_to_table(rows, schema: pa.Schema) -> pa.Table:
+    columns = list(zip(*rows))
+    arrays = [
+        pa.array([_to_arrow_value(v, field.type) for v in col], type=field.type)
+        for col, field in zip(columns, schema)
+    ]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that ParquetWriter fills and iter_parquet drains."""
+    def __init__(self):
+        self.parts, self.pos = [], 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.parts.append(bytes(b))
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.pos
+
+    def drain(self) -> bytes:
+        out, self.parts = b"".join(self.parts), []
+        return out
+
+
+def iter_parquet(conn, sql: str, params=None, chunk_rows: int = None):
+    """Parquet bytes, one row group per cursor chunk; the footer comes last."""
+    sink = _ChunkSink()
+    writer = None
+    for description, rows in iter_row_chunks(conn, sql, params, chunk_rows):
+        if writer is None:
+            schema = arrow_schema(description)
+            writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        if rows:
+            writer.write_table(rows_to_table(rows, schema))
+            yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export(conn, name: str, date_params: dict, fmt: str = "csv", chunk_rows: int = None):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Expected one of {sorted(FORMATS)}")
+    sql, params = dataset_query(name, date_params)
+    stream = iter_parquet if fmt == "parquet" else iter_csv
+    return stream(conn, sql, params, chunk_rows)
+
+# ============================================================================
+# CLI
+# ============================================================================
+def main():
+    from utils import get_db_connection
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--start-date", type=date.fromisoformat, required=True)
+    parser.add_argument("--end-date", type=date.fromisoformat, required=True)
+    parser.add_argument("--format", choices=sorted(FORMATS), default=None, help="defaults to the --out extension, else csv")
+    parser.add_argument("--out", default=None, help="defaults to exports/<dataset>_<start>_<end>.<format>")
+    parser.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    fmt = args.format or (os.path.splitext(args.out)[1].lstrip(".") if args.out else "csv")
+    out = args.out or os.path.join("exports", f"{args.dataset}_{args.start_date}_{args.end_date}.{fmt}")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+
+    date_params = {"start_date": args.start_date, "end_date": args.end_date}
+    conn = get_db_connection()
+    try:
+        written = 0
+        with open(out, "wb") as f:
+            for block in iter_export(conn, args.dataset, date_params, fmt, args.chunk_rows):
+                f.write(block)
+                written += len(block)
+        print(f"✅ {args.dataset} -> {out} ({written / 2**20:.1f} MB)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Build the simplified state boundaries used by the dashboard choropleth.
+
+    python generateData/simplify_geojson.py
+    python generateData/simplify_geojson.py --tolerance 0.02 --precision 3
+
+Reads assets/malaysia_states.geo.json, simplifies every ring with
+Douglas-Peucker (tolerance in degrees, ~0.01 = 1 km), rounds coordinates
+and writes compact JSON to assets/malaysia_states.simplified.geo.json.
+Feature properties (the state name the warehouse regions are keyed on)
+are kept as-is. Re-run whenever the source geojson changes.
+"""
+import argparse
+import json
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # repo root
+SRC = BASE_DIR / "assets" / "malaysia_states.geo.json"
+DST = BASE_DIR / "assets" / "malaysia_states.simplified.geo.json"
+
+
+def _perpendicular_distance(p, a, b):
+    (x, y), (x1, y1), (x2, y2) = p, a, b
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 0 and dy == 0:
+        return ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+    return abs(dy * x - dx * y + x2 * y1 - y2 * x1) / (dx * dx + dy * dy) ** 0.5
+
+
+def douglas_peucker(points, tolerance):
+    """Iterative Douglas-Peucker; always keeps the first and last point."""
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        max_dist, index = 0.0, None
+        for i in range(start + 1, end):
+            d = _perpendicular_distance(points[i], points[start], points[end])
+            if d > max_dist:
+                max_dist, index = d, i
+        if index is not None and max_dist > tolerance:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def simplify_ring(ring, tolerance, precision):
+    simplified = douglas_peucker(ring, tolerance)
+    if len(simplified) < 4:  # a closed ring needs 4 positions; keep the original shape
+        simplified = ring
+    out = []
+    for x, y, *_ in simplified:
+        point = [round(x, precision), round(y, precision)]
+        if not out or out[-1] != point:
+            out.append(point)
+    if out[0] != out[-1]:
+        out.append(out[0])
+    return out
+
+
+def simplify_geometry(geometry, tolerance, precision):
+    if geometry["type"] == "Polygon":
+        coords = [simplify_ring(r, tolerance, precision) for r in geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        coords = [[simplify_ring(r, tolerance, precision) for r in poly] for poly in geometry["coordinates"]]
+    else:
+        raise ValueError(f"Unsupported geometry type: {geometry['type']}")
+    return {"type": geometry["type"], "coordinates": coords}
+
+
+def count_points(geometry):
+    if geometry["type"] == "Polygon":
+        return sum(len(r) for r in geometry["coordinates"])
+    return sum(len(r) for poly in geometry["coordinates"] for r in poly)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--src", type=Path, default=SRC)
+    parser.add_argument("--dst", type=Path, default=DST)
+    parser.add_argument("--tolerance", type=float, default=0.01, help="max deviation in degrees")
+    parser.add_argument("--precision", type=int, default=4, help="decimal places kept per coordinate")
+    args = parser.parse_args()
+
+    with open(args.src, "r", encoding="utf-8") as f:
+        geojson = json.load(f)
+
+    before = after = 0
+    features = []
+    for feature in geojson["features"]:
+        geometry = simplify_geometry(feature["geometry"], args.tolerance, args.precision)
+        before += count_points(feature["geometry"])
+        after += count_points(geometry)
+        features.append({"type": "Feature", "properties": feature["properties"], "geometry": geometry})
+
+    with open(args.dst, "w", encoding="utf-8") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f, separators=(",", ":"))
+
+    print(f"{len(features)} features, {before:,} -> {after:,} points, "
+          f"{args.src.stat().st_size / 1024:.0f} KB -> {args.dst.stat().st_size / 1024:.0f} KB ({args.dst.name})")
+
+
+if __name__ == "__main__":
+    main()
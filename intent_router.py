@@ -0,0 +1,418 @@
+import logging
+import re
+import textwrap
+import threading
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import dashboard_queries as dq
+
+# ============================================================================
+# RULE-BASED INTENT ROUTER FOR CHAT QUESTIONS
+# Most chat traffic is a variation of the FAQ buttons (revenue this quarter,
+# monthly trend, top region, AOV last month). Those are recognized here and
+# answered from fixed, parameterized SQL over wh.fact_orders plus a templated
+# sentence, with no LLM call. Anything else returns None and goes through
+# generate_sql as before.
+#
+#   1. pull one time expression out of the question ("this quarter",
+#      "last 30 days", "Q2 2025", "march 2025", ...) -> (start, end) dates
+#   2. parse the dimension (none / region / channel / time bucket) and the
+#      metric (revenue / orders / customers / AOV) separately; each may be
+#      named at most once
+#   3. every remaining word must be filler, otherwise the question asks for
+#      something the templates can't express (a channel name, a product,
+#      "lowest", "per order", a second period ...) and falls through
+#   4. only the (metric, dimension) pairs in SUPPORTED have a template;
+#      "orders by channel" or "AOV by region" go to generate_sql
+# ============================================================================
+logger = logging.getLogger(__name__)
+
+LOCAL_TZ = ZoneInfo("Asia/Kuala_Lumpur")  # order_date is the Malaysia local date
+
+MONTHS = {
+    name: i for i, name in enumerate(
+        ["january", "february", "march", "april", "may", "june", "july",
+         "august", "september", "october", "november", "december"], 1)
+}
+UNITS = ("week", "month", "quarter", "year")
+BUCKET_WORDS = {"daily": "day", "weekly": "week", "monthly": "month", "quarterly": "quarter", "yearly": "year"}
+
+# Words a routed question may contain besides its time expression, metric and dimension
+FILLER_WORDS = {
+    "what", "whats", "is", "was", "are", "were", "the", "a", "an", "our", "we", "my", "me", "i", "show",
+    "tell", "give", "did", "do", "does", "make", "made", "have", "had", "has", "how", "much", "many", "which",
+    "in", "on", "for", "of", "during", "to", "and", "so", "far", "please", "overall", "total", "get",
+    "generate", "generated", "earn", "earned", "been", "there", "s", "it", "with", "rm", "gross", "current",
+}
+# Extra words allowed once a dimension is named ("revenue by region", "top channel")
+BREAKDOWN_WORDS = {
+    "by", "per", "each", "across", "breakdown", "split", "highest", "most", "top", "best", "biggest", "largest",
+}
+
+
+# ============================================================================
+# TIME EXPRESSIONS -> (start_date, end_date, label), both dates inclusive
+# ============================================================================
+def local_today() -> date:
+    return datetime.now(LOCAL_TZ).date()
+
+
+def _shift_months(d: date, months: int) -> date:
+    year, month = divmod(d.month - 1 + months, 12)
+    return date(d.year + year, month + 1, 1)
+
+
+def _unit_start(d: date, unit: str) -> date:
+    if unit == "week":
+        return d - timedelta(days=d.weekday())
+    if unit == "month":
+        return d.replace(day=1)
+    if unit == "quarter":
+        return date(d.year, 3 * ((d.month - 1) // 3) + 1, 1)
+    return date(d.year, 1, 1)
+
+
+def _previous_unit(today: date, unit: str):
+    end = _unit_start(today, unit) - timedelta(days=1)
+    return _unit_start(end, unit), end
+
+
+def _relative(m, today):
+    which, unit = m.group(1), m.group(2)
+    if which == "this":
+        return _unit_start(today, unit), today, f"this {unit}"
+    start, end = _previous_unit(today, unit)
+    return start, end, f"last {unit}"
+
+
+def _add_months_keep_day(d: date, months: int) -> date:
+    first = _shift_months(d, months)
+    last_day = (_shift_months(first, 1) - timedelta(days=1)).day
+    return first.replace(day=min(d.day, last_day))
+
+
+def _rolling(m, today):
+    n, unit = int(m.group(1)), m.group(2)
+    if n < 1:
+        return None
+    if unit == "day":
+        start = today - timedelta(days=n - 1)
+    elif unit == "week":
+        start = today - timedelta(days=7 * n - 1)
+    else:
+        start = _add_months_keep_day(today, -n) + timedelta(days=1)
+    return start, today, f"last {n} {unit}s"
+
+
+def _quarter(m, today):
+    q = int(m.group(1))
+    year = int(m.group(2)) if m.group(2) else today.year
+    start = date(year, 3 * q - 2, 1)
+    return start, _shift_months(start, 3) - timedelta(days=1), f"Q{q} {year}"
+
+
+def _month(m, today):
+    month = MONTHS[m.group(1)]
+    year = int(m.group(2)) if m.group(2) else (today.year if month <= today.month else today.year - 1)
+    start = date(year, month, 1)
+    return start, _shift_months(start, 1) - timedelta(days=1), f"{start:%B %Y}"
+
+
+def _year(m, today):
+    year = int(m.group(1))
+    return date(year, 1, 1), date(year, 12, 31), str(year)
+
+
+_MONTH_NAMES = "|".join(MONTHS)
+# (pattern, resolver(match, today)); the first match wins
+PERIOD_PATTERNS = [
+    (r"\btoday\b", lambda m, t: (t, t, "today")),
+    (r"\byesterday\b", lambda m, t: (t - timedelta(days=1), t - timedelta(days=1), "yesterday")),
+    (r"\b(?:last|past|previous) (\d+) (day|week|month)s?\b", _rolling),
+    (rf"\b(this|last|previous|past) ({'|'.join(UNITS)})\b", _relative),
+    (r"\b(?:ytd|year to date)\b", lambda m, t: (date(t.year, 1, 1), t, "this year")),
+    (r"\bq([1-4])(?:\s+(20\d{2}))?\b", _quarter),
+    (rf"\b(?:in|for|during|of)\s+({_MONTH_NAMES})(?:\s+(20\d{{2}}))?\b", _month),
+    (rf"\b({_MONTH_NAMES})\s+(20\d{{2}})\b", _month),
+    (r"\b(20\d{2})\b", _year),
+]
+
+
+def extract_period(text: str, today: date = None):
+    """(start_date, end_date, label, text without the expression), or None if there is no time expression."""
+    today = today or local_today()
+    for pattern, resolve in PERIOD_PATTERNS:
+        m = re.search(pattern, text)
+        if m:
+            period = resolve(m, today)
+            if period:
+                return (*period, text[:m.start()] + " " + text[m.end():])
+    return None
+
+
+# ============================================================================
+# INTENTS (first match wins, so the specific ones come first)
+# ============================================================================
+REVENUE = r"\b(revenue|sales?|turnover|income)\b"
+CHAT_TREND_MAX_POINTS = 24  # a chat answer lists every bucket, so keep it short
+
+
+def _rm(value) -> str:
+    return f"RM {float(value or 0):,.2f}"
+
+
+def _bucket_label(value: date, bucket: str) -> str:
+    if bucket == "month":
+        return f"{value:%b %Y}"
+    if bucket == "quarter":
+        return f"Q{(value.month - 1) // 3 + 1} {value.year}"
+    if bucket == "year":
+        return str(value.year)
+    if bucket == "week":
+        return f"week of {value:%Y-%m-%d}"
+    return f"{value:%Y-%m-%d}"
+
+
+def _trend_bucket(question: str, date_params: dict) -> str:
+    for word, bucket in BUCKET_WORDS.items():
+        if re.search(rf"\b{word}\b|\bby {bucket}\b", question):
+            return bucket
+    return dq.pick_time_bucket(date_params["start_date"], date_params["end_date"], CHAT_TREND_MAX_POINTS)
+
+
+def _answer_total(rows, route):
+    r = rows[0] if rows else {}
+    if not r.get("orders"):
+        return f"There were no orders for {route['period']}."
+    return (f"💰 Revenue for {route['period']} was **{_rm(r['revenue'])}** "
+            f"from {r['orders']:,} orders ({r['customers']:,} customers).")
+
+
+def _answer_aov(rows, route):
+    r = rows[0] if rows else {}
+    if not r.get("orders"):
+        return f"There were no orders for {route['period']}, so there is no average order value."
+    return (f"⚡ The average order value for {route['period']} was **{_rm(r['avg_order'])}** "
+            f"({r['orders']:,} orders, {_rm(r['revenue'])} revenue).")
+
+
+def _answer_orders(rows, route):
+    r = rows[0] if rows else {}
+    return f"🧾 There were **{r.get('orders') or 0:,} orders** for {route['period']} ({_rm(r.get('revenue'))} revenue)."
+
+
+def _answer_trend(rows, route):
+    if not rows:
+        return f"There were no orders for {route['period']}."
+    bucket = route["params"]["bucket"]
+    lines = [f"- {_bucket_label(r['order_date'], bucket)}: {_rm(r['revenue'])}" for r in rows]
+    best = max(rows, key=lambda r: r["revenue"] or 0)
+    first, last = float(rows[0]["revenue"] or 0), float(rows[-1]["revenue"] or 0)
+    change = f" ({(last - first) / first * 100:+.1f}% from first to last {bucket})" if first and len(rows) > 1 else ""
+    return "\n".join(
+        [f"📈 Revenue by {bucket} for {route['period']}:"] + lines
+        + [f"\nBest {bucket}: **{_bucket_label(best['order_date'], bucket)}** ({_rm(best['revenue'])}){change}."]
+    )
+
+
+def _answer_ranking(dimension: str, emoji: str):
+    def answer(rows, route):
+        rows = sorted(rows, key=lambda r: r["revenue"] or 0, reverse=True)
+        total = sum(float(r["revenue"] or 0) for r in rows)
+        if not total:
+            return f"There were no orders for {route['period']}."
+        top = rows[0]
+        lines = [
+            f"- {r[dimension]}: {_rm(r['revenue'])} ({float(r['revenue'] or 0) / total:.0%})"
+            for r in rows[:dq.TOP_N]
+        ]
+        return "\n".join(
+            [f"{emoji} **{top[dimension]}** had the highest revenue for {route['period']}: "
+             f"{_rm(top['revenue'])} of {_rm(total)}."] + lines
+        )
+    return answer
+
+
+# Parsed before the metric so "customer region" and "sales channel" are not read as metrics
+DIMENSIONS = {
+    "region": r"\b(customer )?(region|state)s?\b",
+    "channel": r"\b(sales )?(channel|platform|marketplace)s?\b",
+    "time": rf"\b(trends?|over time|{'|'.join(BUCKET_WORDS)}|(by|per|each) ({'|'.join(dq.TIME_BUCKETS)}))\b",
+}
+# Longest phrases first: "average order value" is AOV, not orders
+METRICS = {
+    "aov": r"\b(aov|average order value|avg order value|average order|average basket)\b",
+    "orders": r"\b((number|count) of orders|orders? count|orders)\b",
+    "customers": r"\b((number|count) of customers|customers? count|customers)\b",
+    "revenue": REVENUE,
+}
+
+# name -> (build(date_params, question) -> (sql, params), answer(rows, route) -> str)
+INTENTS = {
+    "region_revenue": (lambda p, q: dq.region_revenue(p), _answer_ranking("region", "🏬")),
+    "channel_revenue": (lambda p, q: dq.channel_revenue(p), _answer_ranking("channel", "🛒")),
+    "avg_order_value": (lambda p, q: dq.kpis(p), _answer_aov),
+    "order_count": (lambda p, q: dq.kpis(p), _answer_orders),
+    "revenue_trend": (lambda p, q: dq.revenue_trend(p, _trend_bucket(q, p)), _answer_trend),
+    "revenue_total": (lambda p, q: dq.kpis(p), _answer_total),
+}
+# (metric, dimension) -> intent; every other pair goes to generate_sql
+SUPPORTED = {
+    ("revenue", None): "revenue_total",
+    ("revenue", "region"): "region_revenue",
+    ("revenue", "channel"): "channel_revenue",
+    ("revenue", "time"): "revenue_trend",
+    ("orders", None): "order_count",
+    ("aov", None): "avg_order_value",
+}
+
+
+def _take(patterns: dict, text: str):
+    """(the one name whose pattern occurs in text or None, text without it); "ambiguous" if several do."""
+    found = []
+    for name, pattern in patterns.items():
+        text, n = re.subn(pattern, " ", text)
+        if n:
+            found.append(name)
+    if len(found) > 1:
+        return "ambiguous", text
+    return (found[0] if found else None), text
+
+
+def parse(question: str, today: date = None):
+    """
+    {"metric", "dimension", "start", "end", "period", "rest"} for a question
+    made only of a time expression, one metric, at most one dimension and
+    filler words, else None. rest is the question without its time expression.
+    """
+    text = question.lower()
+    period = extract_period(text, today)
+    if period is None:
+        return None  # no time frame: the model decides what "revenue" means
+    start, end, label, rest = period
+    if extract_period(rest, today) is not None:
+        return None  # comparisons between periods are not templated
+
+    dimension, left = _take(DIMENSIONS, rest)
+    metric, left = _take(METRICS, left)
+    if metric in (None, "ambiguous") or dimension == "ambiguous":
+        return None
+    allowed = FILLER_WORDS | (BREAKDOWN_WORDS if dimension else set())
+    if not set(re.findall(r"[a-z0-9]+", left)) <= allowed:
+        return None  # mentions something (a channel, product, "lowest", ...) the templates ignore
+    return {"metric": metric, "dimension": dimension, "start": start, "end": end, "period": label, "rest": rest}
+
+
+def _match(question: str, today: date = None):
+    parsed = parse(question, today)
+    name = parsed and SUPPORTED.get((parsed["metric"], parsed["dimension"]))
+    if not name:
+        return None
+    date_params = {"start_date": parsed["start"], "end_date": parsed["end"]}
+    sql, params = INTENTS[name][0](date_params, parsed["rest"])
+    return {"intent": name, "sql": sql, "params": params, "period": parsed["period"], **date_params}
+
+
+# question -> intent (None: generate_sql). python intent_router.py checks them.
+ROUTING_CASES = [
+    ("What is our revenue this quarter?", "revenue_total"),
+    ("total sales last month", "revenue_total"),
+    ("How much revenue did we make in Q2 2025?", "revenue_total"),
+    ("Show the monthly sales trend in 2025", "revenue_trend"),
+    ("revenue by week for the last 3 months", "revenue_trend"),
+    ("Which region had the highest revenue this year?", "region_revenue"),
+    ("Which customer region had the highest revenue in May 2025?", "region_revenue"),
+    ("top states by sales last quarter", "region_revenue"),
+    ("revenue by channel in 2025", "channel_revenue"),
+    ("which sales channel made the most revenue this month", "channel_revenue"),
+    ("What was the average order value last month?", "avg_order_value"),
+    ("AOV this year", "avg_order_value"),
+    ("How many orders were there in July 2025?", "order_count"),
+    ("number of orders yesterday", "order_count"),
+    # metric x dimension pairs without a template
+    ("how many orders by channel last month", None),
+    ("which channel had the highest orders last month", None),
+    ("average order value per channel this month", None),
+    ("which region has the most customers this year", None),
+    ("average order value by region this year", None),
+    ("how many orders per month this year", None),
+    ("how many customers this month", None),
+    # metrics the templates don't compute, or that need the model
+    ("what is the revenue per order this month", None),
+    ("sales count this month", None),
+    ("revenue and orders this month", None),
+    ("revenue by region and channel this year", None),
+    ("highest revenue this month", None),
+    ("which region had the lowest revenue this year", None),
+    ("What was our Shopee revenue in April 2025?", None),
+    ("revenue this month vs last month", None),
+    ("what is our revenue", None),
+]
+
+# ============================================================================
+# ROUTING + COVERAGE
+# ============================================================================
+_stats = {"questions": 0, "routed": 0, "intents": {}}
+_stats_lock = threading.Lock()
+
+
+def route(question: str, today: date = None):
+    """
+    {"intent", "sql", "params", "period", "start_date", "end_date"} when a
+    template answers the question, else None (use generate_sql).
+    """
+    routed = _match(question, today)
+    with _stats_lock:
+        _stats["questions"] += 1
+        if routed:
+            _stats["routed"] += 1
+            _stats["intents"][routed["intent"]] = _stats["intents"].get(routed["intent"], 0) + 1
+    logger.info(
+        "Intent router: %s for %r (coverage %s)",
+        routed["intent"] if routed else "no match", question, f"{router_stats()['coverage']:.0%}",
+    )
+    return routed
+
+
+def router_stats() -> dict:
+    """Questions seen by this process, how many were answered from templates, and per-intent counts."""
+    with _stats_lock:
+        questions, routed = _stats["questions"], _stats["routed"]
+        return {
+            "questions": questions,
+            "routed": routed,
+            "coverage": routed / questions if questions else 0.0,
+            "intents": dict(_stats["intents"]),
+        }
+
+
+def describe(routed: dict) -> str:
+    """The routed SQL as shown in the chat, with the intent and dates on top."""
+    return (
+        f"-- intent {routed['intent']}: {routed['period']} "
+        f"({routed['start_date']} to {routed['end_date']}), answered without an LLM\n"
+        + textwrap.dedent(routed["sql"]).strip()
+    )
+
+
+def answer(routed: dict, columns, rows) -> str:
+    """Templated answer for a routed question's result rows."""
+    records = [dict(zip(columns, r)) for r in rows]
+    return INTENTS[routed["intent"]][1](records, routed)
+
+
+def main():
+    today = date(2025, 8, 15)
+    wrong = 0
+    for question, expected in ROUTING_CASES:
+        got = (_match(question, today) or {}).get("intent")
+        if got != expected:
+            wrong += 1
+            print(f"{question!r}: expected {expected}, routed to {got}")
+    print(f"{len(ROUTING_CASES) - wrong}/{len(ROUTING_CASES)} routing cases pass")
+    raise SystemExit(1 if wrong else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import pandas as pd
 from typing import List, Dict, Any, Optional, Tuple
 
 import psycopg2
+import pytz
 from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 
@@ -16,6 +17,11 @@ load_dotenv("config/.env")  # expects DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PAS
 CHANNELS = ["lazada", "shopee", "tiktok", "pos"]
 SRC_SCHEMAS = {ch: f"src_{ch}" for ch in CHANNELS}
 
+# Business dates (order_date, snapshot_date) are Malaysia calendar days,
+# independent of the database session timezone.
+LOCAL_TZ_NAME = "Asia/Kuala_Lumpur"
+LOCAL_TZ = pytz.timezone(LOCAL_TZ_NAME)
+
 # ---- OPTIONAL: initial master product seeding and bridge mapping overrides ---
 # 1) Seed your golden catalog here (only needed once; safe to keep – it's upsert)
 
@@ -66,6 +72,75 @@ def get_channel_id(cur, channel_name: str) -> int:
         raise RuntimeError(f"Channel '{channel_name}' not found in wh.dim_channel")
     return r[0]
 
+def local_ts(ts) -> Optional[dt.datetime]:
+    """
+    Aware timestamp for a source value. Naive source timestamps are Malaysia
+    local time, so they are stored as that instant whatever the session
+    timezone, and the SQL order_date backfill agrees with local_date.
+    """
+    if ts is None or ts.tzinfo is not None:
+        return ts
+    return LOCAL_TZ.localize(ts)
+
+def local_date(ts) -> Optional[dt.date]:
+    """Calendar date of a timestamp in LOCAL_TZ (see local_ts for naive ones)."""
+    if ts is None:
+        return None
+    return local_ts(ts).astimezone(LOCAL_TZ).date()
+
+def local_today() -> dt.date:
+    return dt.datetime.now(LOCAL_TZ).date()
+
+# Canonical region names are the feature names in assets/malaysia_states.geo.json,
+# so the dashboard can join the warehouse to the map by plain key lookup.
+REGION_NAMES = [
+    "Johor", "Kedah", "Kelantan", "Kuala Lumpur", "Labuan", "Melaka", "Negeri Sembilan",
+    "Pahang", "Penang", "Perak", "Perlis", "Putrajaya", "Sabah", "Sarawak", "Selangor", "Terengganu",
+]
+REGION_ALIASES = {
+    "kl": "Kuala Lumpur",
+    "wp kuala lumpur": "Kuala Lumpur",
+    "wilayah persekutuan kuala lumpur": "Kuala Lumpur",
+    "federal territory of kuala lumpur": "Kuala Lumpur",
+    "wp labuan": "Labuan",
+    "wilayah persekutuan labuan": "Labuan",
+    "wp putrajaya": "Putrajaya",
+    "wilayah persekutuan putrajaya": "Putrajaya",
+    "pulau pinang": "Penang",
+    "malacca": "Melaka",
+    "negri sembilan": "Negeri Sembilan",
+    "n sembilan": "Negeri Sembilan",
+    "johore": "Johor",
+    "trengganu": "Terengganu",
+}
+_REGION_LOOKUP = {**{n.lower(): n for n in REGION_NAMES}, **REGION_ALIASES}
+
+def normalize_region(region) -> Optional[str]:
+    """Maps source spellings ('W.P. Kuala Lumpur', 'Pulau Pinang', ...) to the geojson name."""
+    if region is None:
+        return None
+    key = " ".join(str(region).replace(".", "").replace("-", " ").split()).lower()
+    if not key:
+        return None
+    return _REGION_LOOKUP.get(key, str(region).strip())
+
+def ensure_local_date_columns(conn):
+    """
+    Adds and backfills wh.fact_orders.order_date (order_ts as a Malaysia
+    calendar date) and indexes it, so date filters are plain range scans
+    instead of per-row order_ts::date casts in the session timezone.
+    """
+    with conn.cursor() as cur:
+        cur.execute("ALTER TABLE wh.fact_orders ADD COLUMN IF NOT EXISTS order_date date;")
+        cur.execute("""
+            UPDATE wh.fact_orders
+            SET order_date = (order_ts AT TIME ZONE %s)::date
+            WHERE order_date IS NULL AND order_ts IS NOT NULL;
+        """, (LOCAL_TZ_NAME,))
+        cur.execute("CREATE INDEX IF NOT EXISTS fact_orders_order_date_idx ON wh.fact_orders (order_date);")
+        cur.execute("CREATE INDEX IF NOT EXISTS fact_orders_order_ts_idx ON wh.fact_orders (order_ts);")
+    conn.commit()
+
 def ensure_dim_date(cur, start_date: dt.date, end_date: dt.date):
     if not start_date or not end_date or start_date > end_date:
         return
@@ -220,7 +295,7 @@ def load_dim_customer(conn, channel: str):
         for r in rows:
             data.append((
                 r["source_customer_id"],
-                r.get("region"),
+                normalize_region(r.get("region")),
                 r.get("created_at"),
                 channel
             ))
@@ -285,7 +360,7 @@ def load_fact_orders_and_items_marketplace(conn, channel: str):
             for o in orders:
                 ts = o.get("created_at")
                 if ts:
-                    d = ts.date()
+                    d = local_date(ts)
                     min_d = d if not min_d or d < min_d else min_d
                     max_d = d if not max_d or d > max_d else max_d
                     upsert_fx_myr_passthrough(cur, d)
@@ -303,19 +378,20 @@ def load_fact_orders_and_items_marketplace(conn, channel: str):
 
                 rows.append((
                     o["order_id"], channel_id, customer_sk, None,  # store_sk None for marketplaces
-                    o.get("created_at"), o.get("status"),
+                    local_ts(o.get("created_at")), local_date(o.get("created_at")), o.get("status"),
                     o.get("currency"), gross, net,
                     o.get("shipping_fee"), o.get("tax_total"), o.get("voucher_amount")
                 ))
             if rows:
                 execute_values(cur, """
                     INSERT INTO wh.fact_orders (
-                        order_id, channel_id, customer_sk, store_sk, order_ts, status,
+                        order_id, channel_id, customer_sk, store_sk, order_ts, order_date, status,
                         currency_native, order_total_gross, order_total_net,
                         shipping_fee, tax_total, voucher_amount
                     ) VALUES %s
                     ON CONFLICT (order_id) DO UPDATE
                     SET status = EXCLUDED.status,
+                        order_date = EXCLUDED.order_date,
                         customer_sk = COALESCE(EXCLUDED.customer_sk, wh.fact_orders.customer_sk),
                         store_sk = COALESCE(EXCLUDED.store_sk, wh.fact_orders.store_sk),
                         currency_native = EXCLUDED.currency_native,
@@ -415,7 +491,7 @@ def load_fact_orders_and_items_pos(conn):
             for r in recs:
                 ts = r.get("order_ts")
                 if ts:
-                    d = ts.date()
+                    d = local_date(ts)
                     min_d = d if not min_d or d < min_d else min_d
                     max_d = d if not max_d or d > max_d else max_d
                     upsert_fx_myr_passthrough(cur, d)
@@ -432,20 +508,21 @@ def load_fact_orders_and_items_pos(conn):
                 net = (r.get("subtotal") or 0) - (r.get("discount_total") or 0)
 
                 rows.append((
-                    r["order_id"], channel_id, customer_sk, store_sk, r.get("order_ts"),
-                    r.get("status"), r.get("currency"), gross, net,
+                    r["order_id"], channel_id, customer_sk, store_sk, local_ts(r.get("order_ts")),
+                    local_date(r.get("order_ts")), r.get("status"), r.get("currency"), gross, net,
                     r.get("shipping_fee"), r.get("tax_total"), r.get("discount_total")
                 ))
 
             if rows:
                 execute_values(cur, """
                     INSERT INTO wh.fact_orders (
-                        order_id, channel_id, customer_sk, store_sk, order_ts, status,
+                        order_id, channel_id, customer_sk, store_sk, order_ts, order_date, status,
                         currency_native, order_total_gross, order_total_net,
                         shipping_fee, tax_total, voucher_amount
                     ) VALUES %s
                     ON CONFLICT (order_id) DO UPDATE
                     SET status = EXCLUDED.status,
+                        order_date = EXCLUDED.order_date,
                         customer_sk = COALESCE(EXCLUDED.customer_sk, wh.fact_orders.customer_sk),
                         store_sk = COALESCE(EXCLUDED.store_sk, wh.fact_orders.store_sk),
                         currency_native = EXCLUDED.currency_native,
@@ -578,10 +655,10 @@ def recompute_fact_inventory(conn, start_date: Optional[dt.date] = None, end_dat
     if start_date is None or end_date is None:
         # pick a safe window: min(order date) .. today
         with conn.cursor() as cur:
-            cur.execute("SELECT MIN(order_ts)::date FROM wh.fact_orders;")
-            mind = cur.fetchone()[0] or dt.date.today()
+            cur.execute("SELECT MIN(order_date) FROM wh.fact_orders;")
+            mind = cur.fetchone()[0] or local_today()
         start_date = mind
-        end_date = dt.date.today()
+        end_date = local_today()
 
     with conn.cursor() as cur:
         # ensure dim_date
@@ -598,25 +675,25 @@ def recompute_fact_inventory(conn, start_date: Optional[dt.date] = None, end_dat
         cur.execute("""
             WITH order_days AS (
                 SELECT i.product_sk,
-                       DATE(o.order_ts) AS d,
+                       o.order_date AS d,
                        SUM(i.qty) AS sold_qty
                 FROM wh.fact_order_items i
                 JOIN wh.fact_orders o ON o.order_sk = i.order_sk
-                WHERE o.order_ts::date BETWEEN %s AND %s
-                GROUP BY i.product_sk, DATE(o.order_ts)
+                WHERE o.order_date BETWEEN %s AND %s
+                GROUP BY i.product_sk, o.order_date
             ),
             pos_mov AS (
                 -- Map POS product movements via bridge to master product
                 SELECT b.product_sk,
-                       DATE(m.moved_at) AS d,
+                       (m.moved_at AT TIME ZONE %s)::date AS d,
                        SUM(m.qty_delta) AS delta_qty
                 FROM src_pos.inventory_movements m
                 JOIN wh.bridge_product_source b
                   ON b.source_channel = 'pos'
                  AND b.source_product_id = m.product_id
-                WHERE m.moved_at::date BETWEEN %s AND %s
+                WHERE (m.moved_at AT TIME ZONE %s)::date BETWEEN %s AND %s
                     AND m.movement_type != 'Sale' -- exclude sales, only restocks/adjustments
-                GROUP BY b.product_sk, DATE(m.moved_at)
+                GROUP BY 1, 2
             ),
             all_days AS (
                 SELECT product_sk, d, SUM(delta) AS day_delta
@@ -632,7 +709,7 @@ def recompute_fact_inventory(conn, start_date: Optional[dt.date] = None, end_dat
             SELECT product_sk, d::date AS snapshot_date, day_delta
             FROM all_days
             ORDER BY product_sk, d;
-        """, (start_date, end_date, start_date, end_date))
+        """, (start_date, end_date, LOCAL_TZ_NAME, LOCAL_TZ_NAME, start_date, end_date))
         day_deltas = fetchall_dict(cur)
 
         # 3) current starting_inventory per product
@@ -665,7 +742,7 @@ def recompute_fact_inventory(conn, start_date: Optional[dt.date] = None, end_dat
                 delta_map[d] = delta_map.get(d, 0.0) + float(v)
 
             for d in all_dates:
-                if product_created and d < product_created.date():
+                if product_created and d < local_date(product_created):
                     continue
                 running += delta_map[d]
                 inserts.append((d, psk, running))
@@ -686,15 +763,194 @@ def recompute_fact_inventory(conn, start_date: Optional[dt.date] = None, end_dat
 
     conn.commit()
 
+# ============================================================================
+# CURRENT INVENTORY (one row per product, read directly by the dashboard)
+# ============================================================================
+DAYS_OF_COVER_WINDOW = 28  # days of sales used for the average daily sell-through
+
+def ensure_current_inventory_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS wh.current_inventory (
+                product_sk       bigint PRIMARY KEY REFERENCES wh.dim_product (product_sk),
+                stock_qty        numeric NOT NULL DEFAULT 0,
+                avg_daily_sold   numeric NOT NULL DEFAULT 0,
+                days_of_cover    numeric,
+                last_movement_at timestamptz,
+                updated_at       timestamptz NOT NULL DEFAULT now()
+            );
+        """)
+    conn.commit()
+
+def refresh_current_inventory(conn, as_of: Optional[dt.date] = None):
+    """
+    Upserts wh.current_inventory from the latest wh.fact_inventory snapshot:
+      stock_qty        = latest snapshot stock (starting_inventory if never snapshotted)
+      avg_daily_sold   = units sold over the last DAYS_OF_COVER_WINDOW days / window
+      days_of_cover    = stock_qty / avg_daily_sold (NULL when nothing sells)
+      last_movement_at = latest sale or POS stock movement
+    Between ETL runs the POS server decrements it in place on every receipt.
+    """
+    as_of = as_of or local_today()
+    with conn.cursor() as cur:
+        cur.execute("""
+            WITH latest AS (
+                SELECT DISTINCT ON (product_sk) product_sk, stock_qty
+                FROM wh.fact_inventory
+                ORDER BY product_sk, snapshot_date DESC
+            ),
+            sold AS (
+                SELECT i.product_sk, SUM(i.qty) / %(window)s::numeric AS avg_daily_sold
+                FROM wh.fact_order_items i
+                JOIN wh.fact_orders o ON o.order_sk = i.order_sk
+                WHERE o.order_date > %(as_of)s::date - %(window)s
+                  AND o.order_date <= %(as_of)s
+                GROUP BY i.product_sk
+            ),
+            last_sale AS (
+                SELECT i.product_sk, MAX(o.order_ts) AS ts
+                FROM wh.fact_order_items i
+                JOIN wh.fact_orders o ON o.order_sk = i.order_sk
+                GROUP BY i.product_sk
+            ),
+            last_move AS (
+                SELECT b.product_sk, MAX(m.moved_at) AS ts
+                FROM src_pos.inventory_movements m
+                JOIN wh.bridge_product_source b
+                  ON b.source_channel = 'pos'
+                 AND b.source_product_id = m.product_id
+                GROUP BY b.product_sk
+            )
+            INSERT INTO wh.current_inventory (
+                product_sk, stock_qty, avg_daily_sold, days_of_cover, last_movement_at, updated_at
+            )
+            SELECT
+                p.product_sk,
+                COALESCE(l.stock_qty, p.starting_inventory, 0),
+                COALESCE(s.avg_daily_sold, 0),
+                CASE WHEN s.avg_daily_sold > 0
+                     THEN COALESCE(l.stock_qty, p.starting_inventory, 0) / s.avg_daily_sold END,
+                GREATEST(ls.ts, lm.ts),
+                now()
+            FROM wh.dim_product p
+            LEFT JOIN latest l     ON l.product_sk = p.product_sk
+            LEFT JOIN sold s       ON s.product_sk = p.product_sk
+            LEFT JOIN last_sale ls ON ls.product_sk = p.product_sk
+            LEFT JOIN last_move lm ON lm.product_sk = p.product_sk
+            ON CONFLICT (product_sk) DO UPDATE
+            SET stock_qty        = EXCLUDED.stock_qty,
+                avg_daily_sold   = EXCLUDED.avg_daily_sold,
+                days_of_cover    = EXCLUDED.days_of_cover,
+                last_movement_at = EXCLUDED.last_movement_at,
+                updated_at       = EXCLUDED.updated_at;
+        """, {"window": DAYS_OF_COVER_WINDOW, "as_of": as_of})
+    conn.commit()
+
+# ============================================================================
+# REGION AGGREGATES (Customers tab choropleth)
+# ============================================================================
+def ensure_region_aggregate_tables(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS wh.agg_region_daily (
+                order_date  date    NOT NULL,
+                region      text    NOT NULL,
+                revenue_net numeric NOT NULL DEFAULT 0,
+                orders      bigint  NOT NULL DEFAULT 0,
+                PRIMARY KEY (order_date, region)
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS wh.agg_region_customers (
+                region          text PRIMARY KEY,
+                total_customers bigint NOT NULL DEFAULT 0,
+                updated_at      timestamptz NOT NULL DEFAULT now()
+            );
+        """)
+    conn.commit()
+
+def refresh_region_aggregates(conn, start_date: Optional[dt.date] = None, end_date: Optional[dt.date] = None):
+    """
+    Rebuilds wh.agg_region_daily (net revenue and orders per local order_date
+    and customer region) for a date window, plus the per-region customer base
+    in wh.agg_region_customers. Regions are already normalized in dim_customer.
+    Without a window, the whole history is rebuilt.
+    """
+    with conn.cursor() as cur:
+        if start_date is None or end_date is None:
+            cur.execute("TRUNCATE wh.agg_region_daily;")
+            window_sql, params = "", {}
+        else:
+            cur.execute("""
+                DELETE FROM wh.agg_region_daily
+                WHERE order_date BETWEEN %(start_date)s AND %(end_date)s;
+            """, {"start_date": start_date, "end_date": end_date})
+            window_sql = "AND o.order_date BETWEEN %(start_date)s AND %(end_date)s"
+            params = {"start_date": start_date, "end_date": end_date}
+
+        cur.execute(f"""
+            INSERT INTO wh.agg_region_daily (order_date, region, revenue_net, orders)
+            SELECT
+                o.order_date,
+                COALESCE(NULLIF(c.region, ''), 'Unknown') AS region,
+                COALESCE(SUM(o.order_total_net), 0),
+                COUNT(*)
+            FROM wh.fact_orders o
+            LEFT JOIN wh.dim_customer c ON c.customer_sk = o.customer_sk
+            WHERE o.order_date IS NOT NULL {window_sql}
+            GROUP BY 1, 2;
+        """, params)
+
+        cur.execute("TRUNCATE wh.agg_region_customers;")
+        cur.execute("""
+            INSERT INTO wh.agg_region_customers (region, total_customers, updated_at)
+            SELECT COALESCE(NULLIF(region, ''), 'Unknown'), COUNT(DISTINCT source_customer_id), now()
+            FROM wh.dim_customer
+            GROUP BY 1;
+        """)
+    conn.commit()
+
+# ============================================================================
+# ETL RUNS (data version for HTTP caching in webapp/dashboard_api.py)
+# ============================================================================
+def start_etl_run(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS wh.etl_runs (
+                run_id      bigserial PRIMARY KEY,
+                started_at  timestamptz NOT NULL DEFAULT now(),
+                finished_at timestamptz,
+                status      text NOT NULL DEFAULT 'running'
+            );
+        """)
+        cur.execute("INSERT INTO wh.etl_runs DEFAULT VALUES RETURNING run_id;")
+        run_id = cur.fetchone()[0]
+    conn.commit()
+    return run_id
+
+def finish_etl_run(conn, run_id: int, status: str):
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE wh.etl_runs SET finished_at = clock_timestamp(), status = %s
+            WHERE run_id = %s;
+        """, (status, run_id))
+    conn.commit()
+
 # ============================================================================
 # ORCHESTRATION
 # ============================================================================
 def main():
     conn = get_db_connection()
+    run_id = None
     try:
+        run_id = start_etl_run(conn)
+
         # 0) seed master catalog (optional but recommended before first run)
         seed_master_products(MASTER_PRODUCT_SEED, conn)
 
+        # 0b) local business-date columns + indexes used by the dashboard filters
+        ensure_local_date_columns(conn)
+
         # 1) dimensions (non-product)
         load_dim_store(conn)
         for ch in CHANNELS:
@@ -717,10 +973,21 @@ def main():
         #    You can pass an explicit window, or let it auto-pick min(order_ts)..today
         recompute_fact_inventory(conn)
 
+        # 6) current inventory (dashboard reads this instead of MAX(snapshot_date))
+        ensure_current_inventory_table(conn)
+        refresh_current_inventory(conn)
+
+        # 7) region aggregates (Customers tab)
+        ensure_region_aggregate_tables(conn)
+        refresh_region_aggregates(conn)
+
+        finish_etl_run(conn, run_id, "success")
         print("✅ ETL completed successfully.")
 
     except Exception as e:
         conn.rollback()
+        if run_id is not None:
+            finish_etl_run(conn, run_id, "failed")
         print("❌ ETL failed:", e)
         raise
     finally:
@@ -4,16 +4,29 @@ import psycopg2
 import plotly.express as px
 from dotenv import load_dotenv
 import os
-from utils import get_db_connection, load_data, generate_insight
+import logging
+from utils import get_db_connection, load_data, submit_insights_batch, downsample_lines, label_others, RenderProfiler, load_region_geojson
+from concurrent.futures import as_completed
+import dashboard_queries as dq
+from dashboard_queries import TOP_N, OTHERS_LABEL, MAX_POINTS_PER_SERIES
 import requests, json
+import time
 from datetime import timedelta
 
+logger = logging.getLogger(__name__)
+
 st.set_page_config(page_title="KPI Dashboard", page_icon="🦙", layout="wide")
 st.title("📊 Business KPI Dashboard")
 st.markdown("KPIs across **Shopee, Lazada, TikTok, POS** from warehouse DB.")
 
 from datetime import timedelta
 
+# -----------------------------
+# RENDER PROFILER (opt-in: sidebar toggle, ?profile=1 or DASHBOARD_PROFILE=1)
+# -----------------------------
+profile_default = os.getenv("DASHBOARD_PROFILE") == "1" or st.query_params.get("profile") == "1"
+prof = RenderProfiler(st.sidebar.toggle("⏱️ Profile render", value=profile_default), page="dashboard")
+
 # -----------------------------
 # DATE FILTER
 # -----------------------------
@@ -23,46 +36,50 @@ min_date, max_date = pd.to_datetime(date_range.iloc[0]['min_date']).date(), pd.t
 default_start = max(min_date, max_date - timedelta(days=30))
 default_end = max_date
 
-start_date, end_date = st.date_input(
+col_dates, col_bucket = st.columns([3, 1])
+start_date, end_date = col_dates.date_input(
     "📅 Select Date Range",
     value=(default_start, default_end),  
     min_value=min_date,
     max_value=max_date
 )
+granularity = col_bucket.selectbox("🗓️ Granularity", ["Auto", "Day", "Week", "Month", "Quarter", "Year"])
 date_params = {"start_date": start_date, "end_date": end_date}
 
+# -----------------------------
+# FILTER BAR (pushed into every query's WHERE clause by dashboard_queries)
+# -----------------------------
+@st.cache_data(ttl=600, show_spinner=False)
+def filter_options() -> dict:
+    options_df = load_data(*dq.filter_options())
+    return {dim: sorted(group["value"].astype(str)) for dim, group in options_df.groupby("dimension")}
+
+options = filter_options()
+filter_cols = st.columns(len(dq.FILTER_DIMENSIONS))
+filters = {
+    dim: col.multiselect(dim.title(), options.get(dim, []), placeholder="All")
+    for col, dim in zip(filter_cols, dq.FILTER_DIMENSIONS)
+}
+filters = {dim: values for dim, values in filters.items() if values}
+
+# Trend charts are bucketed in SQL so each series stays under MAX_POINTS_PER_SERIES;
+# a manual finer granularity is reduced with LTTB instead.
+bucket = dq.pick_time_bucket(start_date, end_date) if granularity == "Auto" else granularity.lower()
+BUCKET_FREQ = {"day": "D", "week": "W-MON", "month": "MS", "quarter": "QS", "year": "YS"}
+TICK_FORMAT = {"day": "%Y-%m-%d", "week": "%Y-%m-%d", "month": "%b %Y", "quarter": "%b %Y", "year": "%Y"}
+
 # -----------------------------
 # KPIs
 # -----------------------------
 col1, col2, col3, col4 = st.columns(4)
 
-revenue_df = load_data("""
-    SELECT SUM(order_total_gross) as revenue 
-    FROM wh.fact_orders o
-    WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s;
-""", date_params)
-col1.metric("Total Revenue", f"RM{revenue_df['revenue'][0]:,.2f}")
-
-orders_df = load_data("""
-    SELECT COUNT(*) as orders 
-    FROM wh.fact_orders o
-    WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s;
-""", date_params)
-col2.metric("Total Orders", f"{orders_df['orders'][0]:,}")
-
-customers_df = load_data("""
-    SELECT COUNT(DISTINCT customer_sk) as customers 
-    FROM wh.fact_orders o
-    WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s;
-""", date_params)
-col3.metric("Customers", f"{customers_df['customers'][0]:,}")
-
-aov_df = load_data("""
-    SELECT SUM(order_total_gross)/COUNT(*) as avg_order
-    FROM wh.fact_orders o
-    WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s;
-""", date_params)
-col4.metric("Avg Order Value", f"RM{aov_df['avg_order'][0]:,.2f}")
+with prof.phase("KPIs", "query"):
+    kpi_df = load_data(*dq.kpis(date_params, filters))
+
+col1.metric("Total Revenue", f"RM{kpi_df['revenue'][0]:,.2f}")
+col2.metric("Total Orders", f"{kpi_df['orders'][0]:,}")
+col3.metric("Customers", f"{kpi_df['customers'][0]:,}")
+col4.metric("Avg Order Value", f"RM{kpi_df['avg_order'][0]:,.2f}")
 
 # -----------------------------
 # ORGANIZED LAYOUT WITH TABS
@@ -80,11 +97,11 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs([
 # -----------------------------
 import re
 
-def storytelling_box(content: str, color="#BDCDD6", bgcolor="#D7E3E6"):
+def storytelling_html(content: str, color="#BDCDD6", bgcolor="#D7E3E6") -> str:
     # Replace markdown bold with HTML bold
     safe_content = re.sub(r"\*\*(.*?)\*\*", r"<b>\1</b>", content)
 
-    st.markdown(f"""
+    return f"""
         <div style="
             border: 2px solid #DAD2FF;
             border-radius: 18px;
@@ -105,7 +122,35 @@ def storytelling_box(content: str, color="#BDCDD6", bgcolor="#D7E3E6"):
                 {''.join(f"<li style='margin-bottom: 8px; color:#2B2B2B;'>{line.strip('* ').strip()}</li>" for line in safe_content.splitlines() if line.strip())}
             </ul>
         </div>
-    """, unsafe_allow_html=True)
+    """
+
+
+# Insights are generated off the render path: each box starts as a
+# placeholder and is filled in at the end of the script, where every
+# uncached section is sent to the model in a single batched request.
+pending_insights = {}
+
+def storytelling_slot(section: str, question: str, df: pd.DataFrame):
+    placeholder = st.empty()
+    placeholder.markdown(storytelling_html("⏳ Generating insight..."), unsafe_allow_html=True)
+    if filters:  # so the narrative does not read a filtered slice as the whole business
+        question += " Data is filtered to " + "; ".join(f"{dim}: {', '.join(v)}" for dim, v in filters.items()) + "."
+    pending_insights[section] = (question, df, placeholder)
+
+
+def resolve_storytelling():
+    started = time.perf_counter()
+    futures = submit_insights_batch({name: (q, df) for name, (q, df, _) in pending_insights.items()})
+    placeholders = {futures[name]: (name, placeholder) for name, (_, _, placeholder) in pending_insights.items()}
+    for future in as_completed(placeholders):
+        section, placeholder = placeholders[future]
+        prof.record(section, "insight", (time.perf_counter() - started) * 1000)
+        try:
+            content = future.result()
+        except Exception as e:
+            logger.warning("Insight generation failed for %s: %s", section, e)
+            content = "**Unavailable**: insight could not be generated right now."
+        placeholder.markdown(storytelling_html(content), unsafe_allow_html=True)
 
 
 # -----------------------------
@@ -113,22 +158,19 @@ def storytelling_box(content: str, color="#BDCDD6", bgcolor="#D7E3E6"):
 # -----------------------------
 with tab1:
     st.subheader("📈 Total Revenue Trend")
-    trend_df = load_data("""
-        SELECT order_ts::date as order_date, SUM(order_total_gross) as revenue
-        FROM wh.fact_orders
-        WHERE order_ts::date BETWEEN %(start_date)s AND %(end_date)s
-        GROUP BY order_date
-        ORDER BY order_date;
-    """, date_params)
+    with prof.phase("Revenue Trend", "query"):
+        trend_df = load_data(*dq.revenue_trend(date_params, bucket, filters=filters))
+    with prof.phase("Revenue Trend", "transform"):
+        trend_df = downsample_lines(trend_df, "order_date", "revenue", max_points=MAX_POINTS_PER_SERIES)
     col_chart, col_memo = st.columns([2, 1])
-    with col_chart:
+    with col_chart, prof.phase("Revenue Trend", "chart"):
         if not trend_df.empty:
             fig = px.line(trend_df, x="order_date", y="revenue", title="Revenue Over Time", color_discrete_sequence=["#B2A5FF"])
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No revenue data available for the selected date range.")
     with col_memo:
-        storytelling_box(generate_insight("Summarize revenue trend briefly.", trend_df))
+        storytelling_slot("Revenue Trend", "Summarize revenue trend briefly.", trend_df)
 
 
 # -----------------------------
@@ -136,131 +178,97 @@ with tab1:
 # -----------------------------
 with tab2:
     st.subheader("🏪 Revenue by Channel")
-    channel_df = load_data("""
-        SELECT c.name as channel, SUM(o.order_total_gross) as revenue
-        FROM wh.fact_orders o
-        JOIN wh.dim_channel c ON o.channel_id = c.channel_id
-        WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s
-        GROUP BY c.name;
-    """, date_params)
+    with prof.phase("Revenue by Channel", "query"):
+        channel_df = load_data(*dq.channel_revenue(date_params, filters))
     col_chart, col_memo = st.columns([2, 1])
-    with col_chart:
+    with col_chart, prof.phase("Revenue by Channel", "chart"):
         if not channel_df.empty:
             fig = px.pie(channel_df, names="channel", values="revenue", title="Revenue Share by Channel", color_discrete_sequence=px.colors.qualitative.Pastel1)
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No channel revenue data available for the selected date range.")
     with col_memo:
-        storytelling_box(generate_insight("Summarize revenue by channel briefly.", channel_df))
+        storytelling_slot("Revenue by Channel", "Summarize revenue by channel briefly.", channel_df)
 
     st.subheader("📈 Revenue Trend by Channel")
-    trend_df = load_data("""
-        SELECT o.order_ts::date AS order_date, c.name AS channel, SUM(o.order_total_gross) AS revenue
-        FROM wh.fact_orders o
-        JOIN wh.dim_channel c ON o.channel_id = c.channel_id
-        WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s
-        GROUP BY o.order_ts::date, c.name
-        ORDER BY order_date;
-    """, date_params)
-    all_dates = pd.date_range(trend_df["order_date"].min(), trend_df["order_date"].max(), freq="D")
-    all_channels = trend_df["channel"].unique()
-    full_index = pd.MultiIndex.from_product([all_dates, all_channels], names=["order_date", "channel"])
-    trend_df = trend_df.set_index(["order_date", "channel"]).reindex(full_index, fill_value=0).reset_index()
+    with prof.phase("Revenue Trend by Channel", "query"):
+        trend_df = load_data(*dq.channel_revenue_trend(date_params, bucket, filters=filters))
+    with prof.phase("Revenue Trend by Channel", "transform"):
+        if not trend_df.empty:
+            trend_df["order_date"] = pd.to_datetime(trend_df["order_date"]).astype("datetime64[ns]")
+            all_dates = pd.date_range(trend_df["order_date"].min(), trend_df["order_date"].max(), freq=BUCKET_FREQ[bucket])
+            all_channels = trend_df["channel"].unique()
+            full_index = pd.MultiIndex.from_product([all_dates, all_channels], names=["order_date", "channel"])
+            trend_df = trend_df.set_index(["order_date", "channel"]).reindex(full_index, fill_value=0).reset_index()
+            trend_df = downsample_lines(trend_df, "order_date", "revenue", "channel", MAX_POINTS_PER_SERIES)
     col_chart, col_memo = st.columns([2, 1])
-    with col_chart:
+    with col_chart, prof.phase("Revenue Trend by Channel", "chart"):
         if not trend_df.empty:
-            fig = px.line(trend_df, x="order_date", y="revenue", color="channel", title="Daily Revenue Trend by Channel", markers=True, color_discrete_sequence=px.colors.qualitative.Pastel)
+            fig = px.line(trend_df, x="order_date", y="revenue", color="channel", title=f"Revenue Trend by Channel (per {bucket})", markers=True, color_discrete_sequence=px.colors.qualitative.Pastel)
             fig.update_xaxes(
-                dtick="D1",  
-                tickformat="%Y-%m-%d",
+                tickformat=TICK_FORMAT[bucket],
                 tickangle=-45
             )
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No revenue trend data available for the selected date range.")
     with col_memo:
-        storytelling_box(generate_insight("Summarize revenue trend by channel briefly.", trend_df))
+        storytelling_slot("Revenue Trend by Channel", "Summarize revenue trend by channel briefly.", trend_df)
 
 # -----------------------------
 # PRODUCTS BY REVENUE
 # -----------------------------
 with tab3:
     st.subheader("🔥 Top Products by Revenue")
-    top_products = load_data("""
-        SELECT 
-            p.name AS product, 
-            SUM(oi.revenue_net) AS revenue
-        FROM wh.fact_order_items oi
-        JOIN wh.dim_product p ON oi.product_sk = p.product_sk
-        JOIN wh.fact_orders o ON oi.order_sk = o.order_sk
-        WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s
-        GROUP BY p.name
-        ORDER BY revenue DESC
-        LIMIT 10;
-    """, date_params)
+    st.caption(f"Top {TOP_N} products by sales; the rest are grouped as '{OTHERS_LABEL}'.")
+    with prof.phase("Top Products", "query"):
+        top_products = label_others(load_data(*dq.top_n_sales("product", date_params, filters=filters)), "product")
     col_chart, col_memo = st.columns([2, 1])
-    with col_chart:
+    with col_chart, prof.phase("Top Products", "chart"):
         if not top_products.empty:
-            fig = px.bar(top_products, x="revenue", y="product", orientation="h", title="Top 10 Products", color="product", color_discrete_sequence=px.colors.qualitative.Pastel)
+            fig = px.bar(top_products, x="revenue", y="product", orientation="h", title=f"Top {TOP_N} Products", color="product", color_discrete_sequence=px.colors.qualitative.Pastel, color_discrete_map={OTHERS_LABEL: "#C8C8C8"})
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No product revenue data available for the selected date range.")
     with col_memo:
-        storytelling_box(generate_insight("Summarize top products by revenue briefly.", top_products))
+        storytelling_slot("Top Products", "Summarize top products by revenue briefly.", top_products)
 
     st.subheader("📊 Daily Sales Amount per Category")
-    daily_sales = load_data("""
-        SELECT 
-            o.order_ts::date AS order_date,
-            p.category AS category,   -- 👈 change here
-            SUM(oi.revenue_net) AS daily_sales
-        FROM wh.fact_order_items oi
-        JOIN wh.fact_orders o ON oi.order_sk = o.order_sk
-        JOIN wh.dim_product p ON oi.product_sk = p.product_sk
-        WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s
-        GROUP BY o.order_ts::date, p.category
-        ORDER BY o.order_ts::date, daily_sales DESC;
-    """, date_params)
+    with prof.phase("Daily Sales per Category", "query"):
+        daily_sales = label_others(load_data(*dq.top_n_daily_sales("category", date_params, bucket=bucket, filters=filters)), "category")
+    with prof.phase("Daily Sales per Category", "transform"):
+        daily_sales = downsample_lines(daily_sales, "order_date", "daily_sales", "category", MAX_POINTS_PER_SERIES)
     col_chart, col_memo = st.columns([2, 1])
-    with col_chart:
+    with col_chart, prof.phase("Daily Sales per Category", "chart"):
         if not daily_sales.empty:
-            fig = px.line(daily_sales, x="order_date", y="daily_sales", color="category",   title="Daily Sales Amount per Category", color_discrete_sequence=px.colors.qualitative.Pastel)
+            fig = px.line(daily_sales, x="order_date", y="daily_sales", color="category",   title=f"Sales Amount per Category (per {bucket})", color_discrete_sequence=px.colors.qualitative.Pastel, color_discrete_map={OTHERS_LABEL: "#C8C8C8"})
             fig.update_xaxes(
-                dtick="D1",           
-                tickformat="%Y-%m-%d"
+                tickformat=TICK_FORMAT[bucket]
             )
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No sales data available for the selected date range.")
     with col_memo:
-        storytelling_box(generate_insight("Summarize daily sales per category briefly.", daily_sales))
+        storytelling_slot("Daily Sales per Category", "Summarize daily sales per category briefly.", daily_sales)
 
     st.subheader("📊 Daily Sales Amount per Product")
-    daily_sales = load_data("""
-        SELECT 
-            o.order_ts::date AS order_date,
-            p.name AS product,
-            SUM(oi.revenue_net) AS daily_sales
-        FROM wh.fact_order_items oi
-        JOIN wh.fact_orders o ON oi.order_sk = o.order_sk
-        JOIN wh.dim_product p ON oi.product_sk = p.product_sk
-        WHERE o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s
-        GROUP BY o.order_ts::date, p.name
-        ORDER BY o.order_ts::date, daily_sales DESC;
-    """, date_params)
+    st.caption(f"Top {TOP_N} products by sales; the rest are grouped as '{OTHERS_LABEL}'.")
+    with prof.phase("Daily Sales per Product", "query"):
+        daily_sales = label_others(load_data(*dq.top_n_daily_sales("product", date_params, bucket=bucket, filters=filters)), "product")
+    with prof.phase("Daily Sales per Product", "transform"):
+        daily_sales = downsample_lines(daily_sales, "order_date", "daily_sales", "product", MAX_POINTS_PER_SERIES)
     col_chart, col_memo = st.columns([2, 1])
-    with col_chart:
+    with col_chart, prof.phase("Daily Sales per Product", "chart"):
         if not daily_sales.empty:
-            fig = px.line(daily_sales, x="order_date", y="daily_sales", color="product", title="Daily Sales Amount per Product", color_discrete_sequence=px.colors.qualitative.Pastel)
+            fig = px.line(daily_sales, x="order_date", y="daily_sales", color="product", title=f"Sales Amount per Product (per {bucket})", color_discrete_sequence=px.colors.qualitative.Pastel, color_discrete_map={OTHERS_LABEL: "#C8C8C8"})
             fig.update_xaxes(
-                dtick="D1",           
-                tickformat="%Y-%m-%d" 
+                tickformat=TICK_FORMAT[bucket]
             )
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No sales data available for the selected date range.")
     with col_memo:
-        storytelling_box(generate_insight("Summarize daily sales per product briefly.", daily_sales))
+        storytelling_slot("Daily Sales per Product", "Summarize daily sales per product briefly.", daily_sales)
     
     
 
@@ -269,34 +277,22 @@ with tab3:
 # -----------------------------
 with tab4:
     st.subheader("📦 Inventory Health")
-    inv_df = load_data("""
-        SELECT p.master_product_code, p.name as product, i.stock_qty
-        FROM wh.fact_inventory i
-        JOIN wh.dim_product p ON i.product_sk = p.product_sk
-        WHERE i.snapshot_date = (SELECT MAX(snapshot_date) FROM wh.fact_inventory)
-        ORDER BY i.stock_qty ASC;
-    """)
+    with prof.phase("Inventory Health", "query"):
+        inv_df = load_data(*dq.inventory_health(filters))
     col_chart, col_memo = st.columns([2, 1])
-    with col_chart:
+    with col_chart, prof.phase("Inventory Health", "chart"):
         if not inv_df.empty:
             st.dataframe(inv_df)
         else:
             st.info("No inventory data available.")
     with col_memo:
-        storytelling_box(generate_insight("Summarize inventory health briefly.", inv_df))
+        storytelling_slot("Inventory Health", "Summarize inventory health briefly.", inv_df)
 
     st.subheader("📦 Inventory by Category")
-    inventory_df = load_data("""
-        SELECT p.category AS category,
-        SUM(i.stock_qty) AS stock_qty
-        FROM wh.fact_inventory i
-        JOIN wh.dim_product p ON i.product_sk = p.product_sk
-        WHERE i.snapshot_date = (SELECT MAX(snapshot_date) FROM wh.fact_inventory)
-        GROUP BY p.category
-        ORDER BY stock_qty DESC;
-    """)
+    with prof.phase("Inventory by Category", "query"):
+        inventory_df = load_data(*dq.inventory_by_category(filters))
     col_chart, col_memo = st.columns([2, 1])
-    with col_chart:
+    with col_chart, prof.phase("Inventory by Category", "chart"):
         if not inventory_df.empty:
             fig = px.bar(inventory_df, x="category", y="stock_qty", title="Current Inventory by Category", text_auto=True, color="category", color_discrete_sequence=px.colors.qualitative.Pastel)
             fig.update_layout(xaxis_title="Category", yaxis_title="Quantity")
@@ -304,38 +300,27 @@ with tab4:
         else:
             st.info("No inventory category data available.")
     with col_memo:
-        storytelling_box(
-            generate_insight("Summarize inventory distribution by category briefly.", inventory_df)
-        )
+        storytelling_slot("Inventory by Category", "Summarize inventory distribution by category briefly.", inventory_df)
 
 # -----------------------------
 # CUSTOMER SEGMENT BY STATE 
 # -----------------------------
 with tab5:
     st.subheader("🌏 Customer Segment by State")
-    region_sales = load_data("""
-        SELECT
-            COALESCE(c.region, 'Unknown') AS region,
-            SUM(o.order_total_net) AS total_revenue,
-            COUNT(DISTINCT c.source_customer_id) AS total_customers
-        FROM wh.dim_customer c
-        LEFT JOIN wh.fact_orders o
-        ON c.customer_sk = o.customer_sk
-        AND o.order_ts::date BETWEEN %(start_date)s AND %(end_date)s
-        GROUP BY c.region
-    """, date_params)
-
-    region_sales['region'] = region_sales['region'].replace({None: 'Unknown', '': 'Unknown'})
-    region_sales = region_sales[region_sales['region'] != 'Unknown']
-    with open("assets/malaysia_states.geo.json", "r", encoding="utf-8") as f:
-        geojson = json.load(f)
-    all_regions = [feature['properties']['name'] for feature in geojson['features']]
-    all_regions_df = pd.DataFrame({'region': all_regions})
-    region_sales_full = all_regions_df.merge(region_sales, on='region', how='left')
-    region_sales_full['total_revenue'] = region_sales_full['total_revenue'].fillna(0)
-    region_sales_full['total_customers'] = region_sales_full['total_customers'].fillna(0)
+    with prof.phase("Sales by State", "query"):
+        region_sales = load_data(*dq.region_sales(date_params, filters))
+
+    with prof.phase("Sales by State", "transform"):
+        # regions are normalized to the geojson names by the ETL, so this is a keyed lookup
+        geojson, all_regions = load_region_geojson()
+        region_sales_full = (
+            region_sales.set_index('region')[['total_revenue', 'total_customers']]
+            .reindex(all_regions, fill_value=0)
+            .rename_axis('region')
+            .reset_index()
+        )
     col_chart, col_memo = st.columns([2, 1])
-    with col_chart:
+    with col_chart, prof.phase("Sales by State", "chart"):
         if not region_sales_full.empty:
             fig = px.choropleth(
                 region_sales_full,
@@ -344,6 +329,7 @@ with tab5:
                 featureidkey='properties.name',  
                 color='total_revenue',
                 hover_data=['total_customers','total_revenue'],
+                labels={'total_customers': 'Customers (all, unfiltered)'},
                 color_continuous_scale="Blues",
                 title='Total Revenue by State',
 
@@ -362,5 +348,24 @@ with tab5:
         else:
             st.info("No regional sales data available for the selected date range.")
     with col_memo:
-        storytelling_box(generate_insight("Summarize sales by state briefly.", region_sales_full))
+        storytelling_slot("Sales by State", "Summarize sales by state briefly.", region_sales_full)
+
+    st.subheader("🏆 Top States by Sales")
+    st.caption(f"Top {TOP_N} states by sales; the rest are grouped as '{OTHERS_LABEL}'.")
+    with prof.phase("Top States", "query"):
+        top_regions = label_others(load_data(*dq.top_n_sales("region", date_params, filters=filters)), "region")
+    with prof.phase("Top States", "chart"):
+        if not top_regions.empty:
+            fig = px.bar(top_regions, x="revenue", y="region", orientation="h", title=f"Top {TOP_N} States", color="region", color_discrete_sequence=px.colors.qualitative.Pastel, color_discrete_map={OTHERS_LABEL: "#C8C8C8"})
+            fig.update_layout(showlegend=False, yaxis={"categoryorder": "array", "categoryarray": top_regions["region"].tolist()[::-1]})
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No regional sales data available for the selected date range.")
+
+# -----------------------------
+# AI STORYTELLING (filled in after every chart is on screen)
+# -----------------------------
+resolve_storytelling()
+
+prof.render(extra={"start_date": start_date, "end_date": end_date, "bucket": bucket, "filters": filters})
 
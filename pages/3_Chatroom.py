@@ -4,8 +4,10 @@ import psycopg2
 import plotly.express as px
 from dotenv import load_dotenv
 import os
+import uuid
 from langchain_core.messages import AIMessage, HumanMessage
-from utils import get_db_connection, load_data, init_supabase, load_schema_from_file, get_response
+from utils import get_db_connection, load_data, init_supabase, load_schema_from_file, sql_cache, chat_jobs, ChatQueueFull
+from intent_router import router_stats
 
 load_dotenv()
 
@@ -59,6 +61,35 @@ if "schema_info" not in st.session_state:
     st.session_state.schema_info = load_schema_from_file("config/schema.json")
 if "pending_ai" not in st.session_state:
     st.session_state["pending_ai"] = False
+if "chat_user_id" not in st.session_state:
+    st.session_state["chat_user_id"] = uuid.uuid4().hex  # per-session limit in utils.chat_jobs
+
+POLL_SECONDS = 0.5  # how often a running answer is refreshed
+
+
+def ask(question: str):
+    """Queue a question; asking the one already pending again does not add a duplicate."""
+    if st.session_state["pending_ai"] and st.session_state.get("last_query") == question:
+        return
+    st.session_state.chat_history.append(HumanMessage(content=question))
+    st.session_state["pending_ai"] = True
+    st.session_state["last_query"] = question
+
+sql_stats = sql_cache.stats()
+st.sidebar.caption(
+    f"⚡ SQL cache: {sql_stats['hits']} hits / {sql_stats['misses']} misses "
+    f"({sql_stats['hit_rate']:.0%} hit rate), {sql_stats['entries']} cached questions"
+)
+routing = router_stats()
+st.sidebar.caption(
+    f"🧭 Answered from templates (no LLM): {routing['routed']} of {routing['questions']} questions "
+    f"({routing['coverage']:.0%} coverage)"
+)
+jobs = chat_jobs.stats()
+st.sidebar.caption(
+    f"🧵 Chat jobs: {jobs['running']} running, {jobs['queued']} queued, "
+    f"{jobs['coalesced']} joined an identical question in flight"
+)
 
 # ------------------------------------------------------------------
 # FAQ section 
@@ -97,9 +128,7 @@ st.markdown(button_style, unsafe_allow_html=True)
 for i, item in enumerate(faq_items):
     with cols[i]:
         if st.button(item["q"], key=f"faq_{i}"):
-            st.session_state.chat_history.append(HumanMessage(content=item["q"]))
-            st.session_state["pending_ai"] = True
-            st.session_state["last_query"] = item["q"]
+            ask(item["q"])
             st.rerun()
 
 
@@ -123,19 +152,54 @@ st.markdown("</div>", unsafe_allow_html=True)
 # ------------------------------------------------------------------
 user_query = st.chat_input("Ask me something about your Supabase database...")
 if user_query:
-    st.session_state.chat_history.append(HumanMessage(content=user_query))
-    st.session_state["pending_ai"] = True
-    st.session_state["last_query"] = user_query
+    ask(user_query)
     st.rerun()
 
 # ------------------------------------------------------------------
 # AI response handling
 # ------------------------------------------------------------------
-if st.session_state["pending_ai"]:
-    last_query = st.session_state.get("last_query", None)
-    if last_query:
-        with st.spinner("Thinking..."):
-            response = get_response(last_query)
-        st.session_state.chat_history.append(AIMessage(content=response))
+# The question runs on utils.chat_jobs; this script only submits it and polls,
+# so reruns stay responsive. Asking something else cancels the previous job;
+# while that one winds down (or the pool is full) submitting is retried each poll.
+@st.fragment(run_every=POLL_SECONDS)
+def show_chat_job():
+    job = st.session_state.get("chat_job")
+    if job is None:
+        try:
+            job = st.session_state["chat_job"] = chat_jobs.submit(
+                st.session_state["chat_user_id"], st.session_state["last_query"]
+            )
+        except ChatQueueFull as e:
+            st.status(f"⏳ Waiting to start: {e}...", state="running", expanded=False)
+            return
+    state = job.snapshot()
+    if state["status"] == "queued":
+        label = "Waiting for a free worker..."
+    elif state["executed"] is not None:
+        more = "+" if state["executed"]["truncated"] else ""
+        label = f"{len(state['executed']['rows']):,}{more} rows in {state['executed']['elapsed_ms']:,.0f} ms"
+    else:
+        label = "Running query..." if state["sql"] else "Writing SQL..."
+    with st.status(label, state="complete" if state["finished"] else "running", expanded=not state["finished"]):
+        st.caption(f"Request `{state['request_id']}`")  # quote it to find this request in logs/chat_traces.jsonl
+        if state["sql"]:
+            st.code(state["sql"], language="sql")
+    if state["answer"]:
+        st.markdown(state["answer"])
+
+    if state["finished"]:
+        if state["status"] == "failed":
+            st.session_state.chat_history.append(AIMessage(content=f"⚠️ Something went wrong: {state['error']}"))
+        elif state["status"] == "done":
+            st.session_state.chat_history.append(AIMessage(content=state["answer"]))
         st.session_state["pending_ai"] = False
+        st.session_state["chat_job"] = None
         st.rerun()
+
+
+if st.session_state["pending_ai"] and st.session_state.get("last_query"):
+    job = st.session_state.get("chat_job")
+    if job is not None and job.question != st.session_state["last_query"]:
+        chat_jobs.cancel(st.session_state["chat_user_id"], job)
+        st.session_state["chat_job"] = None
+    show_chat_job()
@@ -0,0 +1,233 @@
+import logging
+import re
+from collections import deque
+
+# ============================================================================
+# SCHEMA RETRIEVAL FOR NL -> SQL PROMPTS
+# Picks the config/schema.json tables (and, for join-only tables, the columns)
+# a question needs and renders them as compact DDL-like lines, instead of
+# pasting the whole schema dict into every prompt.
+#
+#   1. score tables: question words vs table/column names, plus SYNONYMS
+#   2. connect the chosen tables through the foreign-key graph (inferred from
+#      shared *_sk / *_id / *_key columns) so every join path is present
+#   3. render: full columns for matched tables, keys + matched columns for
+#      tables only needed as join bridges, plus the schema rules that apply
+# ============================================================================
+logger = logging.getLogger(__name__)
+
+SCHEMA_NAME = "wh"
+MAX_TABLES = 6
+CHARS_PER_TOKEN = 4  # rough estimate, good enough for budgeting prompts (shared with utils)
+# Used when nothing in the question matches (e.g. "how are we doing?")
+DEFAULT_TABLES = ("fact_orders", "dim_channel")
+# ETL aggregates for the dashboard (net revenue per region, ...); chat answers
+# come from the facts so the gross-revenue rule holds, so these are never offered
+DERIVED_PREFIXES = ("agg_",)
+
+# question word -> table or column names it refers to
+SYNONYMS = {
+    "revenue": ["order_total_gross"], "sales": ["order_total_gross", "revenue_net"],
+    "income": ["order_total_gross"], "turnover": ["order_total_gross"], "aov": ["fact_orders"],
+    "transaction": ["fact_orders"], "purchase": ["fact_orders"], "basket": ["fact_orders"],
+    "buyer": ["dim_customer"], "client": ["dim_customer"], "shopper": ["dim_customer"],
+    "item": ["fact_order_items", "dim_product"], "sku": ["dim_product"], "brand": ["brand"],
+    "category": ["category"], "quantity": ["qty"], "unit": ["qty"], "sold": ["qty", "fact_order_items"],
+    "region": ["dim_customer"], "state": ["region", "dim_customer"], "location": ["region", "dim_customer"],
+    "area": ["region", "dim_customer"],
+    "platform": ["dim_channel"], "marketplace": ["dim_channel"], "shopee": ["dim_channel"],
+    "lazada": ["dim_channel"], "tiktok": ["dim_channel"], "pos": ["dim_channel"], "online": ["dim_channel"],
+    "outlet": ["dim_store"], "branch": ["dim_store"], "shop": ["dim_store"],
+    "stock": ["current_inventory"], "inventory": ["current_inventory"], "restock": ["current_inventory"],
+    "return": ["fact_refunds"], "refund": ["fact_refunds"],
+    "ad": ["fact_ads_spend"], "ads": ["fact_ads_spend"], "advert": ["fact_ads_spend"],
+    "marketing": ["fact_ads_spend", "dim_campaign"], "roas": ["fact_ads_spend"],
+    "impression": ["impressions"], "click": ["clicks"], "spend": ["spend_native"],
+    "profit": ["margin", "cost"], "voucher": ["voucher_amount"], "coupon": ["voucher_amount"],
+    "weekend": ["is_weekend"], "fx": ["fx_rates"], "exchange": ["fx_rates"], "currency": ["fx_rates"],
+}
+
+TYPE_ABBREVIATIONS = {
+    "timestamp with time zone": "timestamptz",
+    "timestamp without time zone": "timestamp",
+    "character varying": "varchar",
+    "integer": "int",
+}
+
+_STOPWORDS = {"the", "a", "an", "of", "in", "on", "by", "for", "and", "or", "to", "is", "are", "what",
+              "which", "how", "many", "much", "show", "me", "my", "this", "last", "per", "with", "from"}
+# Too generic to pick tables on their own: dates go through fact_orders.order_date (see the rules)
+_GENERIC = {"day", "daily", "week", "weekly", "month", "monthly", "quarter", "year", "yearly", "date", "time",
+            "today", "yesterday", "trend", "total", "value", "amount", "number", "count", "average", "avg",
+            "highest", "lowest", "top", "best", "worst", "most", "least", "name", "id"}
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _words(text: str) -> set:
+    return {_stem(w) for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in _STOPWORDS | _GENERIC}
+
+
+def _name_words(name: str) -> set:
+    return {_stem(w) for w in name.lower().split("_") if w not in ("fact", "dim", "agg", "wh")}
+
+
+def _is_key(column: str) -> bool:
+    return column.endswith(("_sk", "_id", "_key"))
+
+
+def foreign_keys(tables: dict) -> dict:
+    """
+    {table: {column: referenced table}} inferred from key column names:
+    customer_sk is owned by dim_customer, order_sk by fact_orders, date_key by dim_date.
+    """
+    columns = {t: {c["name"] for c in cols} for t, cols in tables.items()}
+    owners = {}
+    for cols in columns.values():
+        for col in cols:
+            if _is_key(col) and col not in owners:
+                stem = col.rsplit("_", 1)[0]
+                for candidate in (f"dim_{stem}", f"fact_{stem}s", f"fact_{stem}"):
+                    if col in columns.get(candidate, ()):
+                        owners[col] = candidate
+                        break
+    return {
+        t: {col: owners[col] for col in sorted(cols) if col in owners and owners[col] != t}
+        for t, cols in columns.items()
+    }
+
+
+def _graph(fks: dict) -> dict:
+    graph = {t: set() for t in fks}
+    for table, refs in fks.items():
+        for target in refs.values():
+            graph[table].add(target)
+            graph.setdefault(target, set()).add(table)
+    return graph
+
+
+def _shortest_path(graph: dict, start: str, goal: str) -> list:
+    previous, queue = {start: None}, deque([start])
+    while queue:
+        node = queue.popleft()
+        if node == goal:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = previous[node]
+            return path[::-1]
+        for nxt in sorted(graph.get(node, ())):
+            if nxt not in previous:
+                previous[nxt] = node
+                queue.append(nxt)
+    return []
+
+
+_SYNONYMS = {_stem(word): targets for word, targets in SYNONYMS.items()}
+
+
+def score_tables(tables: dict, question: str):
+    """
+    Returns ({table: score}, {table: matched columns}). A table-name match
+    scores 3 (1 for bridge_* mapping tables), a synonym 3 for a table or 2
+    for a column, and a plain column-name match 1.
+    """
+    words = _words(question)
+    scores, matched = {}, {}
+    column_owners = {}
+    for table, cols in tables.items():
+        for c in cols:
+            column_owners.setdefault(c["name"], []).append(table)
+
+    def hit(table, weight, column=None):
+        scores[table] = scores.get(table, 0) + weight
+        if column:
+            matched.setdefault(table, set()).add(column)
+
+    for table, cols in tables.items():
+        if words & _name_words(table):
+            hit(table, 1 if table.startswith("bridge_") else 3)
+        for c in cols:
+            if words & _name_words(c["name"]):
+                hit(table, 1, c["name"])
+
+    for word in words:
+        for target in _SYNONYMS.get(word, ()):
+            if target in tables:
+                hit(target, 3)
+            for table in column_owners.get(target, ()):
+                hit(table, 2, target)
+    return scores, matched
+
+
+def relevant_tables(schema_info: dict, question: str, max_tables: int = MAX_TABLES):
+    """
+    Returns (matched tables, bridge tables, {table: matched columns}); matched
+    ones are ranked by score, bridges only connect them through foreign keys.
+    """
+    tables = {t: cols for t, cols in schema_info["tables"].items() if not t.startswith(DERIVED_PREFIXES)}
+    scores, matched_cols = score_tables(tables, question)
+    # weak matches (a single column name) only count next to a strong one
+    threshold = max(2, max(scores.values(), default=0) / 3)
+    ranked = sorted((t for t in scores if scores[t] >= threshold), key=lambda t: (-scores[t], t))[:max_tables]
+    chosen = ranked or [t for t in DEFAULT_TABLES if t in tables]
+
+    graph = _graph(foreign_keys(tables))
+    connected = [chosen[0]]
+    for table in chosen[1:]:
+        best = min(
+            (p for p in (_shortest_path(graph, c, table) for c in connected) if p),
+            key=len, default=[table],
+        )
+        connected.extend(t for t in best if t not in connected)
+    bridges = [t for t in connected if t not in chosen]
+    return chosen, bridges, matched_cols
+
+
+def render_schema(schema_info: dict, tables: list, bridges: list = (), matched_cols: dict = None) -> str:
+    """Compact DDL: wh.table(col type, fk_col type -> wh.dim_x, ...) plus the rules that mention those tables."""
+    matched_cols = matched_cols or {}
+    all_tables = schema_info["tables"]
+    fks = foreign_keys(all_tables)
+    lines = []
+    for table in list(tables) + list(bridges):
+        cols = []
+        for c in all_tables[table]:
+            name = c["name"]
+            if table in bridges and not (_is_key(name) or name in matched_cols.get(table, ())):
+                continue
+            col = f"{name} {TYPE_ABBREVIATIONS.get(c['type'], c['type'])}"
+            if name in fks.get(table, {}):
+                col += f" -> {SCHEMA_NAME}.{fks[table][name]}"
+            cols.append(col)
+        suffix = "  -- join only, other columns omitted" if table in bridges else ""
+        lines.append(f"{SCHEMA_NAME}.{table}({', '.join(cols)}){suffix}")
+
+    selected = set(tables) | set(bridges)
+    rules = [
+        f"- {text}" for text in (schema_info.get("rules") or {}).values()
+        if any(re.search(rf"\b{t}\b", text) for t in selected)
+    ]
+    if rules:
+        lines += ["Rules:"] + rules
+    return "\n".join(lines)
+
+
+def prune_schema(schema_info: dict, question: str, max_tables: int = MAX_TABLES) -> str:
+    """Schema text for an NL -> SQL prompt, limited to what the question needs. Logs the size saved."""
+    tables, bridges, matched_cols = relevant_tables(schema_info, question, max_tables)
+    text = render_schema(schema_info, tables, bridges, matched_cols)
+    full = len(repr(schema_info))
+    logger.info(
+        "Schema for %r: %d -> %d tables (%s), ~%d -> ~%d tokens",
+        question, len(schema_info["tables"]), len(tables) + len(bridges),
+        ", ".join(tables + [f"{b} (join)" for b in bridges]),
+        full // CHARS_PER_TOKEN, len(text) // CHARS_PER_TOKEN,
+    )
+    return text
@@ -0,0 +1,82 @@
+import io
+import os
+import sys
+from collections import namedtuple
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import exports
+
+Column = namedtuple("Column", "name type_code precision scale")
+
+
+class FakeCursor:
+    def __init__(self, description, rows):
+        self.description, self.rows = description, list(rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchmany(self, size):
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+
+class FakeConnection:
+    autocommit = True
+
+    def __init__(self, description, rows):
+        self.description, self.rows = description, rows
+
+    def cursor(self, name=None):
+        return FakeCursor(self.description, self.rows)
+
+    def rollback(self):
+        pass
+
+
+def read_parquet(description, rows, chunk_rows=2):
+    conn = FakeConnection(description, rows)
+    data = b"".join(exports.iter_parquet(conn, "SELECT 1", chunk_rows=chunk_rows))
+    return pq.read_table(io.BytesIO(data))
+
+
+def test_unconstrained_numeric_round_trips_as_decimal():
+    description = [Column("order_id", 25, None, None), Column("order_total_gross", exports.PG_NUMERIC, None, None)]
+    rows = [("A1", Decimal("1234567.89")), ("A2", Decimal("0.1")), ("A3", None)]
+
+    table = read_parquet(description, rows)
+
+    assert table.schema.field("order_total_gross").type == exports.NUMERIC_DEFAULT_TYPE
+    assert table.column("order_total_gross").to_pylist() == [Decimal("1234567.89"), Decimal("0.1"), None]
+    assert pc.sum(table.column("order_total_gross")).as_py() == Decimal("1234567.99")
+
+
+def test_declared_numeric_keeps_its_precision_and_scale():
+    description = [Column("price", exports.PG_NUMERIC, 10, 2)]
+
+    table = read_parquet(description, [(Decimal("19.90"),)])
+
+    assert table.schema.field("price").type == pa.decimal128(10, 2)
+    assert table.column("price").to_pylist() == [Decimal("19.90")]
+
+
+def test_numeric_wider_than_decimal128_is_exact_text():
+    description = [Column("big", exports.PG_NUMERIC, 50, 0)]
+    value = Decimal("1" + "0" * 45)
+
+    table = read_parquet(description, [(value,)])
+
+    assert pa.types.is_string(table.schema.field("big").type)
+    assert table.column("big").to_pylist() == [format(value, "f")]
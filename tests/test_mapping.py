@@ -0,0 +1,45 @@
+import datetime as dt
+import os
+import sys
+from zoneinfo import ZoneInfo
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("pytz")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+_cwd = os.getcwd()
+os.chdir(ROOT)  # mapping reads data/master_product.csv at import
+try:
+    import mapping
+finally:
+    os.chdir(_cwd)
+
+KL = ZoneInfo("Asia/Kuala_Lumpur")
+UTC = dt.timezone.utc
+
+
+def backfilled_order_date(stored_ts: dt.datetime) -> dt.date:
+    """What ensure_local_date_columns computes: (order_ts AT TIME ZONE 'Asia/Kuala_Lumpur')::date."""
+    return stored_ts.astimezone(KL).date()
+
+
+@pytest.mark.parametrize("source_ts, expected", [
+    (dt.datetime(2025, 5, 31, 23, 59, 59), dt.date(2025, 5, 31)),  # naive: Malaysia local
+    (dt.datetime(2025, 6, 1, 0, 0, 1), dt.date(2025, 6, 1)),
+    (dt.datetime(2025, 5, 31, 16, 30, tzinfo=UTC), dt.date(2025, 6, 1)),  # 00:30 in Malaysia
+    (dt.datetime(2025, 5, 31, 15, 59, tzinfo=UTC), dt.date(2025, 5, 31)),  # 23:59 in Malaysia
+])
+def test_order_near_midnight_gets_the_same_date_at_insert_and_backfill(source_ts, expected):
+    stored = mapping.local_ts(source_ts)
+
+    assert stored.tzinfo is not None
+    assert mapping.local_date(source_ts) == expected
+    assert backfilled_order_date(stored) == expected
+
+
+def test_local_ts_keeps_missing_values():
+    assert mapping.local_ts(None) is None
+    assert mapping.local_date(None) is None
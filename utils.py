@@ -10,12 +10,216 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 import plotly.express as px
 import streamlit as st
 import pandas as pd
+import numpy as np
 import psycopg2
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions, retry as api_retry
 import json
+import hashlib
+import sqlite3
+import threading
+import time
+import logging
+import io
+import csv
+import subprocess
+import unicodedata
+import zoneinfo
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, Future
+from schema_retriever import prune_schema, CHARS_PER_TOKEN
+from chat_trace import ChatTrace, NULL_TRACE, new_request_id
+import intent_router
+from dashboard_queries import OTHERS_LABEL
 
 load_dotenv("config/.env")
 
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("INSIGHT_CACHE_DIR", ".cache")
+
+# Process-wide pool for LLM insight calls; bounded so a busy dashboard
+# cannot flood the model API with concurrent requests.
+INSIGHT_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("INSIGHT_WORKERS", 4)),
+    thread_name_prefix="insight",
+)
+
+# ============================================================================
+# SINGLE-FLIGHT (coalesce identical in-flight work across Streamlit sessions)
+# ============================================================================
+class SingleFlight:
+    """
+    While a call for `key` is running, identical calls from other sessions wait
+    for its result instead of running fn again. Nothing is kept after the call
+    finishes; result caching stays with the callers.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future of the running call
+        self.calls = self.executions = self.coalesced = self.errors = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            self.calls += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            logger.debug("single-flight %s: waiting on in-flight %s", self.name, key)
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self.errors += 1
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "in_flight": len(self._inflight),
+                "coalesce_rate": round(self.coalesced / self.calls, 3) if self.calls else 0.0,
+            }
+
+
+query_flight = SingleFlight("load_data")
+insight_flight = SingleFlight("insight")
+
+
+def single_flight_stats() -> list:
+    return [query_flight.stats(), insight_flight.stats()]
+
+# ============================================================================
+# LLM CLIENTS (created once per process, shared by chat and insights)
+# ============================================================================
+# genai.configure() rebuilds the underlying API client, and every new
+# ChatGoogleGenerativeAI opens its own channel, so both are made once here and
+# reused; calls share one timeout and retry/backoff policy.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+
+_RETRYABLE = (
+    api_exceptions.ResourceExhausted,    # 429
+    api_exceptions.ServiceUnavailable,   # 503
+    api_exceptions.InternalServerError,  # 500
+    api_exceptions.DeadlineExceeded,
+)
+
+_llm_clients = {}
+_llm_lock = threading.Lock()
+_llm_backend = None
+
+
+def use_llm_backend(backend):
+    """
+    Serve gemini_model() / chat_llm() from backend.gemini_model(model) and
+    backend.chat_llm(model, temperature) instead of Gemini (offline runs,
+    see benchmarks/bench_chat.py); None goes back to the real clients.
+    """
+    global _llm_backend
+    with _llm_lock:
+        _llm_backend = backend
+        _llm_clients.clear()
+
+
+def _llm_client(key: tuple, create):
+    with _llm_lock:
+        entry = _llm_clients.get(key)
+        if entry is None:
+            start = time.perf_counter()
+            entry = _llm_clients[key] = {"client": create(), "setup_ms": (time.perf_counter() - start) * 1000, "uses": 0}
+            logger.info("LLM client %s created in %.1f ms", "/".join(map(str, key)), entry["setup_ms"])
+        entry["uses"] += 1
+        return entry["client"]
+
+
+def gemini_model(model: str) -> genai.GenerativeModel:
+    """Shared google.generativeai model; call generate_content with genai_request_options()."""
+    def create():
+        if _llm_backend is not None:
+            return _llm_backend.gemini_model(model)
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        return genai.GenerativeModel(model)
+    return _llm_client(("genai", model), create)
+
+
+def _retry_predicate(max_retries: int):
+    """Retryable errors only, and at most max_retries of them (Retry itself only has a deadline)."""
+    is_retryable = api_retry.if_exception_type(*_RETRYABLE)
+    retries = 0
+
+    def predicate(exc) -> bool:
+        nonlocal retries
+        if retries >= max_retries or not is_retryable(exc):
+            return False
+        retries += 1
+        return True
+    return predicate
+
+
+def genai_request_options(stream: bool = False) -> dict:
+    """
+    Timeout plus up to LLM_MAX_RETRIES retries with exponential backoff on rate
+    limits / transient errors (not for streams, which can't be replayed).
+    Build the options per call: the retry count lives in them.
+    """
+    options = {"timeout": LLM_TIMEOUT_SECONDS}
+    if not stream:
+        options["retry"] = api_retry.Retry(
+            predicate=_retry_predicate(LLM_MAX_RETRIES),
+            initial=1.0, multiplier=2.0, maximum=2.0 ** LLM_MAX_RETRIES,
+            timeout=LLM_TIMEOUT_SECONDS * (LLM_MAX_RETRIES + 1),
+        )
+    return options
+
+
+def chat_llm(model: str, temperature: float = 0.1) -> ChatGoogleGenerativeAI:
+    """Shared LangChain chat model with the same timeout and retry budget."""
+    def create():
+        if _llm_backend is not None:
+            return _llm_backend.chat_llm(model, temperature)
+        return ChatGoogleGenerativeAI(
+            model=model,
+            google_api_key=os.getenv("GEMINI_API_KEY"),
+            temperature=temperature,
+            timeout=LLM_TIMEOUT_SECONDS,
+            max_retries=LLM_MAX_RETRIES,
+        )
+    return _llm_client(("langchain", model, temperature), create)
+
+
+def llm_client_stats() -> list:
+    """One row per client: one-off setup time and how many calls reused it."""
+    with _llm_lock:
+        return [
+            {"client": "/".join(map(str, key)), "setup_ms": round(e["setup_ms"], 1), "uses": e["uses"]}
+            for key, e in _llm_clients.items()
+        ]
+
 # ============================================================================
 # INIT SUPABASE DATABASE CONNECTION
 # ============================================================================
@@ -29,12 +233,161 @@ def get_db_connection():
     )
 
 
-def load_data(query, params=None):
+# "arrow": COPY ... TO STDOUT streamed into pyarrow, Arrow-backed dtypes (default)
+# "sql":   pd.read_sql over the DB-API cursor (row tuples, NumPy/object dtypes)
+LOAD_DATA_BACKEND = os.getenv("LOAD_DATA_BACKEND", "arrow")
+
+
+# Postgres type OID -> Arrow type of the COPY CSV column (cf. exports.PG_ARROW_TYPES).
+# Anything else stays text, so codes like '007' keep their zeros; numeric is
+# float64 for the charts. timestamptz is parsed with its offset, then shown in
+# the session time zone like psycopg2's tz-aware datetimes.
+PG_CSV_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(), 21: pa.int16(), 23: pa.int32(),
+    700: pa.float32(), 701: pa.float64(), 1700: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC"),
+}
+
+
+def _arrow_timezone(name: str) -> str:
+    try:
+        zoneinfo.ZoneInfo(name)
+        return name
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        return "UTC"  # e.g. a POSIX offset string; the instants are still right
+
+
+def fetch_arrow(query, params=None) -> pa.Table:
+    """
+    Run a SELECT through COPY (...) TO STDOUT (CSV) and parse it column-wise
+    with pyarrow, skipping per-row Python tuple materialization. Column types
+    come from the query's result description, not from the CSV text.
+    """
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            sql = cur.mogrify(query, params).decode() if params else query
+            sql = sql.strip().rstrip(";")
+            cur.execute(f"SELECT * FROM ({sql}) AS q LIMIT 0")
+            description = cur.description
+            cur.execute("SHOW TimeZone")
+            session_tz = _arrow_timezone(cur.fetchone()[0])
+            buf = io.BytesIO()
+            cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", buf)
+    finally:
+        conn.close()
+    buf.seek(0)
+    table = pa_csv.read_csv(
+        buf,
+        convert_options=pa_csv.ConvertOptions(
+            column_types={c.name: PG_CSV_TYPES.get(c.type_code, pa.string()) for c in description},
+            true_values=["t"], false_values=["f"],
+            # Postgres writes NULL as an unquoted empty field and '' as a quoted one
+            strings_can_be_null=True, quoted_strings_can_be_null=False,
+        ),
+    )
+    local = pa.timestamp("us", tz=session_tz)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type) and field.type.tz is not None:
+            table = table.set_column(i, field.name, table.column(i).cast(local))
+    return table
+
+
+def _load_data(query, params, backend):
+    if backend == "arrow":
+        return fetch_arrow(query, params).to_pandas(types_mapper=pd.ArrowDtype)
     conn = get_db_connection()
     df = pd.read_sql(query, conn, params=params)
     conn.close()
     return df
 
+
+def load_data(query, params=None, backend=None):
+    """
+    Identical concurrent queries (same SQL, params and backend) share one
+    database round trip; every caller gets its own copy of the DataFrame.
+    """
+    backend = backend or LOAD_DATA_BACKEND
+    key_params = sorted(params.items()) if isinstance(params, dict) else params
+    key = hashlib.sha256(repr((backend, query, key_params)).encode()).hexdigest()
+    return query_flight.do(key, lambda: _load_data(query, params, backend)).copy()
+
+# ============================================================================
+# LTTB DOWNSAMPLING FOR LINE CHARTS
+# ============================================================================
+def lttb(df: pd.DataFrame, x: str, y: str, max_points: int) -> pd.DataFrame:
+    """
+    Largest-Triangle-Three-Buckets point reduction: keeps max_points rows of
+    a single series (sorted by x) while preserving its visual shape.
+    """
+    n = len(df)
+    if max_points >= n or max_points < 3:
+        return df
+    xs = df[x]
+    if not pd.api.types.is_numeric_dtype(xs):
+        xs = pd.to_datetime(xs).astype("int64")
+    xs = xs.to_numpy(dtype=float)
+    ys = df[y].to_numpy(dtype=float)
+
+    every = (n - 2) / (max_points - 2)
+    keep = [0]
+    a = 0
+    for i in range(max_points - 2):
+        start = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        next_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        avg_x, avg_y = xs[end:next_end].mean(), ys[end:next_end].mean()
+        area = np.abs((xs[a] - avg_x) * (ys[start:end] - ys[a]) - (xs[a] - xs[start:end]) * (avg_y - ys[a]))
+        a = start + int(area.argmax())
+        keep.append(a)
+    keep.append(n - 1)
+    return df.iloc[keep]
+
+
+def downsample_lines(df: pd.DataFrame, x: str, y: str, series: str = None, max_points: int = 120) -> pd.DataFrame:
+    """Apply lttb to every series of a long-format line-chart DataFrame."""
+    if df.empty:
+        return df
+    df = df.sort_values(x)
+    if series is None:
+        return lttb(df, x, y, max_points).reset_index(drop=True)
+    parts = [lttb(part, x, y, max_points) for _, part in df.groupby(series, sort=False)]
+    return pd.concat(parts).sort_values(x).reset_index(drop=True)
+
+
+def label_others(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    """
+    Drops the is_other flag of a Top-N + Others result (dashboard_queries.top_n_*).
+    A real value named OTHERS_LABEL becomes "Others (<column>)", so it keeps its
+    own bar / series instead of merging with the bucket.
+    """
+    if "is_other" not in df.columns:
+        return df
+    df = df.copy()
+    df.loc[~df["is_other"].astype(bool) & (df[column] == OTHERS_LABEL), column] = f"{OTHERS_LABEL} ({column})"
+    return df.drop(columns="is_other")
+
+# ============================================================================
+# MAP BOUNDARIES (parsed once per process)
+# ============================================================================
+# Built by generateData/simplify_geojson.py; falls back to the full-resolution file.
+REGION_GEOJSON = "assets/malaysia_states.simplified.geo.json"
+REGION_GEOJSON_FULL = "assets/malaysia_states.geo.json"
+
+
+@st.cache_resource
+def load_region_geojson(path: str = None):
+    """Returns (geojson, region names). Names match wh.dim_customer.region as normalized by the ETL."""
+    path = path or (REGION_GEOJSON if os.path.exists(REGION_GEOJSON) else REGION_GEOJSON_FULL)
+    with open(path, "r", encoding="utf-8") as f:
+        geojson = json.load(f)
+    regions = tuple(feature["properties"]["name"] for feature in geojson["features"])
+    return geojson, regions
+
+
 def init_supabase() -> SQLDatabase:
     """
     Initialize Supabase connection using environment variables and get_db_connection.
@@ -57,11 +410,9 @@ def load_schema_from_file(path="config/schema.json") -> dict:
 # ============================================================================
 # SQL GENERATION CHAIN
 # ============================================================================
-def generate_sql(user_question: str, schema_info: dict) -> str:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    model = genai.GenerativeModel("gemini-2.5-flash")
+SQL_MODEL = "gemini-2.5-flash"
 
-    prompt = f"""
+SQL_TEMPLATE = """
     You are a data analyst. 
     Here is the database schema:
     {schema_info}
@@ -70,14 +421,33 @@ def generate_sql(user_question: str, schema_info: dict) -> str:
     - Always use schema-qualified table names in the format wh.table_name
     - When calculating revenue, ALWAYS use the column 'order_total_gross' from 'wh.fact_orders'. 
       Do NOT use revenue_net, order_total_net, or join to fact_order_items.
+    - Filter and group orders by date with 'order_date' from 'wh.fact_orders' (Malaysia local date).
+      Do NOT cast order_ts (e.g. order_ts::date or DATE(order_ts)).
     - Use PostgreSQL syntax
     - Return only the SQL query, no markdown, no explanation
 
     User question: {user_question}
     """
 
-    response = model.generate_content(prompt)
-    sql_query = response.text.strip()
+
+def generate_sql(user_question: str, schema_info: dict, trace: ChatTrace = NULL_TRACE) -> str:
+    model = gemini_model(SQL_MODEL)
+
+    with trace.span("build_prompt") as span:
+        # only the tables/columns this question needs, not the whole schema dict
+        schema_text = prune_schema(schema_info, user_question)
+        prompt = SQL_TEMPLATE.format(schema_info=schema_text, user_question=user_question)
+        span.update(schema_tokens=estimate_tokens(schema_text), prompt_tokens=estimate_tokens(prompt))
+
+    with trace.span("generate_sql", model=SQL_MODEL) as span:
+        start = time.perf_counter()
+        response = model.generate_content(prompt, request_options=genai_request_options())
+        logger.info(
+            "generate_sql: ~%d prompt tokens, %.0f ms",
+            estimate_tokens(prompt), (time.perf_counter() - start) * 1000,
+        )
+        sql_query = response.text.strip()
+        span.update(prompt_tokens=estimate_tokens(prompt), output_tokens=estimate_tokens(sql_query))
 
     if sql_query.startswith("```"):
         sql_query = sql_query.strip("`")
@@ -88,15 +458,97 @@ def generate_sql(user_question: str, schema_info: dict) -> str:
     return sql_query.strip()
 
 
+# ============================================================================
+# GUARDED CHAT SQL EXECUTION (model-written SQL never runs unbounded)
+# ============================================================================
+CHAT_SQL_TIMEOUT_MS = int(os.getenv("CHAT_SQL_TIMEOUT_MS", 15000))
+CHAT_SQL_MAX_COST = float(os.getenv("CHAT_SQL_MAX_COST", 5_000_000))
+CHAT_SQL_MAX_ROWS = int(os.getenv("CHAT_SQL_MAX_ROWS", 1000))
+
+
+def check_chat_sql(sql_query: str) -> str:
+    """Single SELECT/WITH statement without the trailing semicolon, else ValueError."""
+    sql = sql_query.strip().rstrip(";").strip()
+    if not sql.lower().startswith(("select", "with")):
+        raise ValueError("only SELECT queries can be run from the chat")
+    if ";" in sql:
+        raise ValueError("only a single statement can be run from the chat")
+    return sql
+
+
+def plan_cost(cursor, sql: str, params=None) -> float:
+    """Planner's total cost estimate for the query (nothing is executed)."""
+    cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    return float(cursor.fetchone()[0][0]["Plan"]["Total Cost"])
+
+
+def run_chat_sql(sql_query: str, params=None, max_rows: int = None, max_cost: float = None, timeout_ms: int = None) -> dict:
+    """
+    Runs chat-generated SQL in a read-only transaction with a statement
+    timeout, after refusing (ValueError) plans costlier than max_cost, and
+    streams at most max_rows rows through a server-side cursor.
+
+    Returns {"columns", "rows", "truncated", "cost", "bytes", "elapsed_ms"};
+    truncated means the query had more than max_rows rows, bytes is the size
+    of the fetched rows as text.
+    """
+    max_rows = max_rows or CHAT_SQL_MAX_ROWS
+    max_cost = max_cost or CHAT_SQL_MAX_COST
+    timeout_ms = timeout_ms or CHAT_SQL_TIMEOUT_MS
+    sql = check_chat_sql(sql_query)
+
+    start = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        conn.set_session(readonly=True)
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL statement_timeout = %s", (timeout_ms,))
+            cost = plan_cost(cur, sql, params)
+        if cost > max_cost:
+            raise ValueError(f"estimated query cost {cost:,.0f} is above the chat limit of {max_cost:,.0f}")
+
+        with conn.cursor(name="chat_sql") as cur:
+            cur.itersize = min(max_rows + 1, 2000)
+            cur.execute(sql, params)
+            rows = cur.fetchmany(max_rows + 1)
+            columns = [c.name for c in cur.description]
+    finally:
+        conn.rollback()
+        conn.close()
+
+    truncated = len(rows) > max_rows
+    rows = rows[:max_rows]
+    result = {
+        "columns": columns,
+        "rows": rows,
+        "truncated": truncated,
+        "cost": cost,
+        "bytes": sum(len(str(v)) for row in rows for v in row if v is not None),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    logger.info(
+        "chat SQL: cost %.0f, %d rows%s, %.0f ms",
+        cost, len(result["rows"]), " (truncated)" if truncated else "", result["elapsed_ms"],
+    )
+    return result
+
+
 # ============================================================================
 # NATURAL LANGUAGE RESPONSE CHAIN
 # ============================================================================
-def summarize_result(result, sql_query, user_question: str) -> str:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    summary_prompt = f"""
-    The SQL query returned: {result}
-    User question: {user_question}
+SUMMARY_MODEL = "gemini-2.5-flash"
+
+
+def summary_prompt(columns, rows, sql_query, user_question: str, truncated: bool = False) -> str:
+    truncation_note = (
+        f"Note: the query returned more than {len(rows)} rows; only the first {len(rows)} were fetched. "
+        "Say that the answer is based on a partial result.\n"
+        if truncated else ""
+    )
+    return f"""
+    The SQL query returned ({len(rows)} rows):
+    {encode_result(columns, rows)}
+    {truncation_note}User question: {user_question}
     SQL query executed: {sql_query}
 
     You are a helpful data analyst. Based on the results, user question, and SQL query executed,
@@ -105,28 +557,720 @@ def summarize_result(result, sql_query, user_question: str) -> str:
     - Use RM as currency unit if relevant.
     - Keep it concise, structured, and easy to understand.
     """
-    answer = model.generate_content(summary_prompt)
-    return answer.text.strip()
+
+
+def stream_summary(columns, rows, sql_query, user_question: str, truncated: bool = False,
+                   trace: ChatTrace = NULL_TRACE):
+    """Yields the answer text chunk by chunk as the model generates it."""
+    model = gemini_model(SUMMARY_MODEL)
+    with trace.span("build_summary_prompt", rows=len(rows)) as span:
+        prompt = summary_prompt(columns, rows, sql_query, user_question, truncated)
+        span["prompt_tokens"] = estimate_tokens(prompt)
+
+    with trace.span("summarize", model=SUMMARY_MODEL) as span:
+        start = time.perf_counter()
+        first_token_ms = None
+        output_chars = 0
+        for chunk in model.generate_content(prompt, stream=True, request_options=genai_request_options(stream=True)):
+            if not chunk.parts:
+                continue
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - start) * 1000
+            output_chars += len(chunk.text)
+            yield chunk.text
+        logger.info(
+            "summary: first token %.0f ms, done %.0f ms",
+            first_token_ms or 0, (time.perf_counter() - start) * 1000,
+        )
+        span.update(
+            prompt_tokens=estimate_tokens(prompt),
+            output_tokens=(output_chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN,
+            first_token_ms=round(first_token_ms or 0, 1),
+        )
+
+
+def summarize_result(columns, rows, sql_query, user_question: str, truncated: bool = False) -> str:
+    return "".join(stream_summary(columns, rows, sql_query, user_question, truncated)).strip()
 
 
 # ============================================================================
 # MAIN FLOW (replacement for get_response)
 # ============================================================================
+def stream_response(user_question: str, request_id: str = None):
+    """
+    The chat pipeline as events, each available as soon as its stage ends:
+
+        ("sql", sql_query)        generated (or cached) SQL
+        ("rows", executed)        run_chat_sql result: columns, rows, truncated, ...
+        ("answer", chunks)        generator of answer text chunks (for st.write_stream)
+
+    A refused or timed-out query ends with ("answer", chunks) of a short
+    explanation instead, right after the "sql" event. Questions the intent
+    router recognizes use its SQL template and templated answer (no LLM).
+
+    Every stage is a span of one trace under request_id (see chat_trace.py);
+    the trace is written once the answer chunks have been consumed.
+    """
+    trace = ChatTrace("chat", request_id=request_id, question=user_question)
+    answered = False
+    try:
+        for kind, payload in _chat_events(user_question, trace):
+            if kind == "answer":
+                answered = True
+                payload = trace.stream(payload)
+            yield kind, payload
+    except GeneratorExit:
+        if not answered:
+            trace.end(abandoned=True)  # e.g. a Streamlit rerun mid-request
+        raise
+    except Exception as e:
+        trace.end(e)
+        raise
+
+
+def _chat_events(user_question: str, trace: ChatTrace):
+    with trace.span("route") as span:
+        routed = intent_router.route(user_question)
+        span["intent"] = routed["intent"] if routed else None
+    if routed:
+        sql_query, sql_params = routed["sql"], routed["params"]
+        sql_key, from_cache = None, False
+        trace.annotate(route="intent")
+        yield "sql", intent_router.describe(routed)
+    else:
+        sql_params = None
+        with trace.span("sql_cache_lookup") as span:
+            schema_info = load_schema_from_file()
+            sql_key = sql_cache_key(user_question, prune_schema(schema_info, user_question))
+            sql_query = sql_cache.get(sql_key)
+            from_cache = span["hit"] = sql_query is not None
+        if from_cache:
+            logger.debug("Cached SQL: %s", sql_query)
+        else:
+            sql_query = generate_sql(user_question, schema_info, trace)
+            logger.debug("Generated SQL: %s", sql_query)
+        trace.annotate(route="cached" if from_cache else "llm")
+        yield "sql", sql_query
+
+    try:
+        with trace.span("execute_sql") as span:
+            executed = run_chat_sql(sql_query, sql_params)
+            span.update(
+                rows=len(executed["rows"]), bytes=executed["bytes"],
+                truncated=executed["truncated"], cost=executed["cost"],
+            )
+    except (ValueError, psycopg2.extensions.QueryCanceledError) as e:
+        if from_cache:
+            sql_cache.delete(sql_key)
+        logger.warning("Chat SQL refused for %r: %s", user_question, e)
+        trace.annotate(refused=str(e).strip())
+        yield "answer", iter([
+            f"⚠️ I couldn't run the query for that question ({str(e).strip()}). "
+            "Try narrowing it down, e.g. to a date range, a channel or a top 10."
+        ])
+        return
+    except Exception:
+        if from_cache:
+            sql_cache.delete(sql_key)  # stale for this database; regenerate next time
+        raise
+    if routed:
+        yield "rows", executed
+        with trace.span("template_answer"):
+            text = intent_router.answer(routed, executed["columns"], executed["rows"])
+        yield "answer", iter([text])
+        return
+    if not from_cache:
+        sql_cache.set(sql_key, sql_query)  # only SQL that actually ran is reused
+    logger.info("SQL cache %s for %r (%s)", "hit" if from_cache else "miss", user_question, sql_cache.stats())
+    yield "rows", executed
+
+    yield "answer", stream_summary(
+        executed["columns"], executed["rows"], sql_query, user_question,
+        truncated=executed["truncated"], trace=trace,
+    )
+
+
 def get_response(user_question: str):
-    schema_info = load_schema_from_file()
-    sql_query = generate_sql(user_question, schema_info)
-    print("Generated SQL:", sql_query)
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(sql_query)
-    result = cursor.fetchall()
-    print("SQL Result:", result)
-    final_answer = summarize_result(result, sql_query, user_question)
-    print("Final Answer:", final_answer)
+    final_answer = ""
+    for kind, payload in stream_response(user_question):
+        if kind == "answer":
+            final_answer = "".join(payload).strip()
+    logger.debug("Final answer: %s", final_answer)
     return final_answer
 
-def generate_insight(user_query: str, df: pd.DataFrame):
-    template = """
+
+# ============================================================================
+# CHAT JOBS (questions run on a bounded pool, not the session's script thread)
+# ============================================================================
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", 4))
+CHAT_JOBS_PER_USER = int(os.getenv("CHAT_JOBS_PER_USER", 1))
+CHAT_MAX_PENDING = int(os.getenv("CHAT_MAX_PENDING", 16))
+
+
+class ChatQueueFull(RuntimeError):
+    """The user already has CHAT_JOBS_PER_USER questions running, or the queue is full."""
+
+
+class ChatJob:
+    """
+    One question running stream_response on a worker. The worker records the
+    events as they arrive; pages poll snapshot(). Cancellation is checked
+    between stages and answer chunks (a model call already sent finishes).
+    """
+
+    def __init__(self, question: str, request_id: str = None):
+        self.question = question
+        self.request_id = request_id or new_request_id()
+        self.subscribers = set()  # user ids waiting on this job
+        self.users = set()  # every user id that ever waited on it
+        self.future = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._state = {"status": "queued", "sql": None, "executed": None, "answer": [], "error": None}
+
+    def _update(self, **changes):
+        with self._lock:
+            self._state.update(changes)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self) -> bool:
+        """Ask the worker to stop; True when the job had not started (so never will)."""
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self._update(status="cancelled")
+            return True
+        return False
+
+    def run(self):
+        if self._cancel.is_set():
+            self._update(status="cancelled")
+            return
+        self._update(status="running")
+        events = stream_response(self.question, request_id=self.request_id)
+        answer = None
+        try:
+            for kind, payload in events:
+                if self._cancel.is_set():
+                    break
+                if kind == "sql":
+                    self._update(sql=payload)
+                elif kind == "rows":
+                    self._update(executed=payload)
+                elif kind == "answer":
+                    answer = payload
+                    for chunk in answer:
+                        if self._cancel.is_set():
+                            break
+                        with self._lock:
+                            self._state["answer"].append(chunk)
+            self._update(status="cancelled" if self._cancel.is_set() else "done")
+        except Exception as e:
+            logger.exception("Chat job %s failed", self.request_id)
+            self._update(status="failed", error=str(e))
+        finally:
+            if answer is not None:
+                answer.close()  # ends the trace of a cancelled answer
+            events.close()
+
+    def snapshot(self) -> dict:
+        """{"status", "sql", "executed", "answer" (text so far), "error", "request_id", "finished"}"""
+        with self._lock:
+            state = dict(self._state, answer="".join(self._state["answer"]))
+        state["request_id"] = self.request_id
+        state["finished"] = state["status"] in ("done", "failed", "cancelled")
+        return state
+
+
+class ChatJobQueue:
+    """
+    Bounded pool for chat questions. An identical question already in flight
+    (any user) is joined instead of run twice, each user may have at most
+    per_user questions in flight, and a job is cancelled once every user
+    waiting on it has cancelled (e.g. asked something else).
+
+    A cancelled job keeps its worker until it reaches the next stage, so it
+    still counts against its users and max_pending until the worker is free;
+    only the dedup index forgets it at once.
+    """
+
+    def __init__(self, workers: int, per_user: int, max_pending: int):
+        self.per_user = per_user
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat")
+        self._lock = threading.Lock()
+        self._jobs = set()  # queued or running, cancelled ones included until their worker stops
+        self._by_key = {}  # normalized question -> live (not cancelled) job, for dedup
+        self.submitted = self.coalesced = self.rejected = self.cancelled = 0
+
+    def _in_flight_for(self, user_id: str) -> int:
+        return sum(
+            user_id in job.subscribers or (job.cancelled and user_id in job.users)
+            for job in self._jobs
+        )
+
+    def submit(self, user_id: str, question: str) -> ChatJob:
+        key = normalize_question(question)
+        with self._lock:
+            job = self._by_key.get(key)
+            if job is not None and user_id in job.subscribers:
+                return job  # a rerun asking the same question again
+            mine = self._in_flight_for(user_id)
+            if mine >= self.per_user:
+                self.rejected += 1
+                raise ChatQueueFull(f"{mine} earlier question(s) still running")
+            if job is None:
+                if len(self._jobs) >= self.max_pending:
+                    self.rejected += 1
+                    raise ChatQueueFull("the assistant is busy")
+                job = self._by_key[key] = ChatJob(question)
+                self._jobs.add(job)
+                self.submitted += 1
+                job.future = self._executor.submit(self._run, key, job)
+            else:
+                self.coalesced += 1
+            job.subscribers.add(user_id)
+            job.users.add(user_id)
+        return job
+
+    def _run(self, key: str, job: ChatJob):
+        try:
+            job.run()
+        finally:
+            self._forget(key, job)
+
+    def _forget(self, key: str, job: ChatJob):
+        with self._lock:
+            self._jobs.discard(job)
+            if self._by_key.get(key) is job:
+                del self._by_key[key]
+
+    def cancel(self, user_id: str, job: ChatJob):
+        """user_id stops waiting on job; the job itself stops when nobody waits on it."""
+        key = normalize_question(job.question)
+        with self._lock:
+            job.subscribers.discard(user_id)
+            if job.subscribers or job.cancelled:
+                return
+            if self._by_key.get(key) is job:
+                del self._by_key[key]  # a new ask starts a fresh job
+            self.cancelled += 1
+        if job.cancel():
+            self._forget(key, job)  # never started, so _run will not clean up
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = [(job.snapshot()["status"], job.cancelled) for job in self._jobs]
+            return {
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "running": sum(status == "running" for status, _ in jobs),
+                "cancelling": sum(status == "running" and cancelled for status, cancelled in jobs),
+                "queued": sum(status == "queued" for status, _ in jobs),
+            }
+
+
+chat_jobs = ChatJobQueue(CHAT_WORKERS, CHAT_JOBS_PER_USER, CHAT_MAX_PENDING)
+
+# ============================================================================
+# PERSISTENT CACHE (shared by every Streamlit session in this process)
+# ============================================================================
+class PersistentCache:
+    """
+    Small SQLite-backed key/value cache with a TTL and an LRU size bound.
+    Entries survive Streamlit reruns, sessions and process restarts.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0  # per process
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            # Drop expired rows first, then the least recently used ones over the bound
+            self._conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute("""
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": entries,
+            }
+
+
+insight_cache = PersistentCache(
+    os.path.join(CACHE_DIR, "insights.sqlite"),
+    ttl_seconds=int(os.getenv("INSIGHT_CACHE_TTL", 24 * 60 * 60)),
+    max_entries=int(os.getenv("INSIGHT_CACHE_MAX_ENTRIES", 512)),
+)
+
+
+def hash_dataframe(df: pd.DataFrame) -> str:
+    """Content hash of a DataFrame (values, index, column names and dtypes)."""
+    h = hashlib.sha256()
+    h.update(repr(list(df.columns)).encode())
+    h.update(repr([str(t) for t in df.dtypes]).encode())
+    try:
+        h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    except TypeError:
+        # Unhashable cell values (lists, dicts, ...) - fall back to the CSV text
+        h.update(df.to_csv(index=True).encode())
+    return h.hexdigest()
+
+
+# ============================================================================
+# QUESTION -> SQL CACHE (skips the SQL-generation LLM call for repeat questions)
+# ============================================================================
+sql_cache = PersistentCache(
+    os.path.join(CACHE_DIR, "sql.sqlite"),
+    ttl_seconds=int(os.getenv("SQL_CACHE_TTL", 24 * 60 * 60)),
+    max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", 1024)),
+)
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace, emoji and trailing-punctuation insensitive form of a chat question."""
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = "".join(ch for ch in text if ch.isalnum() or ch.isspace() or ch in "%-_'.,:/$")
+    return " ".join(text.split()).strip(" .,:")
+
+
+def sql_cache_key(question: str, schema_text: str) -> str:
+    """
+    Normalized question + the pruned schema text its SQL prompt carries + SQL
+    prompt/model. Editing schema.json or schema_retriever (synonyms, table
+    limit, rendering) changes schema_text, so either invalidates the entry.
+    """
+    return hashlib.sha256(
+        f"{SQL_MODEL}\n{SQL_TEMPLATE}\n{schema_text}\n{normalize_question(question)}".encode()
+    ).hexdigest()
+
+
+# ============================================================================
+# TOKEN-BUDGETED DATA SUMMARIZATION (what the LLM sees instead of raw tables)
+# ============================================================================
+INSIGHT_TOKEN_BUDGET = int(os.getenv("INSIGHT_TOKEN_BUDGET", 600))
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _fmt_num(value) -> str:
+    if pd.isna(value):
+        return "n/a"
+    value = float(value)
+    if value.is_integer() and abs(value) < 1e15:
+        return f"{int(value):,}"
+    return f"{value:,.2f}"
+
+
+def _split_columns(df: pd.DataFrame):
+    """Classify columns into (date column or None, measure columns, dimension columns)."""
+    date_col, measures, dims = None, [], []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            dims.append(col)
+        elif pd.api.types.is_numeric_dtype(series):
+            measures.append(col)
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            date_col = date_col or col
+        else:
+            sample = series.dropna().head(20)
+            if date_col is None and len(sample) and all(hasattr(v, "year") and hasattr(v, "month") for v in sample):
+                date_col = col
+            else:
+                dims.append(col)
+    # Identifier-like columns (codes, ids) are dimensions, not measures
+    for col in list(measures):
+        if col.endswith(("_id", "_sk", "_code")):
+            measures.remove(col)
+            dims.append(col)
+    return date_col, measures, dims
+
+
+def _trend_lines(daily: pd.Series, label: str) -> list:
+    lines = []
+    if len(daily) >= 2:
+        days = (daily.index - daily.index[0]).days.to_numpy(dtype=float)
+        slope = float(np.polyfit(days, daily.to_numpy(dtype=float), 1)[0]) if days[-1] > 0 else 0.0
+        first, last = daily.iloc[0], daily.iloc[-1]
+        change = f" ({(last - first) / first * 100:+.1f}% first→last)" if first else ""
+        lines.append(f"trend {label}: slope {slope:+,.2f}/day{change}")
+    span = (daily.index[-1] - daily.index[0]).days if len(daily) else 0
+    if span >= 13:
+        end = daily.index[-1]
+        this_week = daily[daily.index > end - pd.Timedelta(days=7)].sum()
+        prev_week = daily[(daily.index <= end - pd.Timedelta(days=7)) & (daily.index > end - pd.Timedelta(days=14))].sum()
+        wow = f"{(this_week - prev_week) / prev_week * 100:+.1f}%" if prev_week else "n/a"
+        lines.append(f"week-over-week {label}: last 7d {_fmt_num(this_week)} vs prior 7d {_fmt_num(prev_week)} ({wow})")
+    return lines
+
+
+def _outlier_line(values: pd.Series, label: str, max_items: int = 3):
+    values = values.dropna()
+    if len(values) < 5:
+        return None
+    std = values.std()
+    if not std:
+        return None
+    z = (values - values.mean()) / std
+    outliers = z[z.abs() >= 2.5].abs().sort_values(ascending=False).head(max_items)
+    if outliers.empty:
+        return None
+    items = ", ".join(f"{_fmt_label(idx)}={_fmt_num(values[idx])} (z={z[idx]:+.1f})" for idx in outliers.index)
+    return f"outliers {label}: {items}"
+
+
+def _fmt_label(value) -> str:
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+def summarize_dataframe(df: pd.DataFrame, token_budget: int = None, top_n: int = 5) -> str:
+    """
+    Reduce a dataset to a bounded-size statistical digest for LLM prompts:
+    totals, min/max, top-N, trend slopes, week-over-week change and outliers.
+    Small tables that already fit the budget are sent as-is.
+    """
+    token_budget = token_budget or INSIGHT_TOKEN_BUDGET
+    if df.empty:
+        return "No data for the selected filters."
+
+    if len(df) <= 200:
+        full = df.to_string(index=False)
+        if estimate_tokens(full) <= token_budget:
+            return full
+
+    date_col, measures, dims = _split_columns(df)
+    dates = pd.to_datetime(df[date_col]) if date_col else None
+    data = df.assign(**{date_col: dates}) if date_col else df
+
+    # Sections in priority order; lower-priority ones are dropped first to fit the budget
+    sections = [f"rows: {len(df):,}; columns: {', '.join(map(str, df.columns))}"]
+    if date_col:
+        sections.append(f"{date_col}: {dates.min():%Y-%m-%d} to {dates.max():%Y-%m-%d} ({dates.dt.normalize().nunique()} distinct days)")
+
+    for m in measures:
+        col = data[m]
+        sections.append(f"{m}: total {_fmt_num(col.sum())}, mean {_fmt_num(col.mean())}, min {_fmt_num(col.min())}, max {_fmt_num(col.max())}")
+
+    for m in measures:
+        for d in dims:
+            by_dim = data.groupby(d, dropna=False)[m].sum().sort_values(ascending=False)
+            head = by_dim.head(top_n)
+            rest = by_dim.iloc[top_n:]
+            items = ", ".join(f"{_fmt_label(k)}={_fmt_num(v)}" for k, v in head.items())
+            tail = f"; {len(rest)} others={_fmt_num(rest.sum())}" if len(rest) else ""
+            sections.append(f"top {len(head)} {d} by {m}: {items}{tail}")
+            if len(by_dim) > top_n:
+                sections.append(f"bottom {d} by {m}: " + ", ".join(
+                    f"{_fmt_label(k)}={_fmt_num(v)}" for k, v in by_dim.tail(min(3, len(by_dim) - top_n)).items()
+                ))
+
+    if date_col:
+        for m in measures:
+            daily = data.groupby(data[date_col].dt.normalize())[m].sum().sort_index()
+            sections.extend(_trend_lines(daily, m))
+            line = _outlier_line(daily, f"{m} by day")
+            if line:
+                sections.append(line)
+            for d in dims[:1]:
+                leaders = data.groupby(d)[m].sum().sort_values(ascending=False).head(3).index
+                for key in leaders:
+                    part = data[data[d] == key].groupby(data[date_col].dt.normalize())[m].sum().sort_index()
+                    sections.extend(_trend_lines(part, f"{m} for {d}={_fmt_label(key)}"))
+    else:
+        for m in measures:
+            label_col = dims[0] if dims else None
+            values = data.set_index(label_col)[m] if label_col else data[m]
+            if label_col and not values.index.is_unique:
+                values = values.groupby(level=0).sum()
+            line = _outlier_line(values, m)
+            if line:
+                sections.append(line)
+
+    budget_chars = token_budget * CHARS_PER_TOKEN
+    while len(sections) > 1 and len("\n".join(sections)) > budget_chars:
+        sections.pop()
+    digest = "\n".join(sections)
+    return digest[:budget_chars]
+
+
+def _estimate_table_chars(df: pd.DataFrame) -> int:
+    sample = df.head(200)
+    if sample.empty:
+        return 0
+    return int(len(sample.to_string(index=False)) * len(df) / len(sample))
+
+
+def prompt_data(df: pd.DataFrame, label: str, token_budget: int = None) -> str:
+    """Digest df for a prompt and log how much smaller it is than the raw table."""
+    digest = summarize_dataframe(df, token_budget)
+    before = _estimate_table_chars(df)
+    logger.info(
+        "Prompt data for %r: ~%d -> ~%d tokens (%d rows)",
+        label, before // CHARS_PER_TOKEN, estimate_tokens(digest), len(df),
+    )
+    return digest
+
+
+# ---------- Chat query results ----------
+CHAT_RESULT_TOKEN_BUDGET = int(os.getenv("CHAT_RESULT_TOKEN_BUDGET", 800))
+
+
+def result_frame(columns, rows) -> pd.DataFrame:
+    """DataFrame of DB-API rows with Decimal columns made numeric."""
+    df = pd.DataFrame(rows, columns=columns)
+    for col in df.columns:
+        values = df[col].dropna()
+        if df[col].dtype == object and len(values) and all(isinstance(v, (Decimal, int, float)) for v in values):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def _value_type(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_numeric_dtype(series):
+        return "num"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "timestamp"
+    values = series.dropna()
+    if len(values) and all(isinstance(v, datetime) for v in values):
+        return "timestamp"
+    if len(values) and all(hasattr(v, "isoformat") for v in values):
+        return "date"
+    return "text"
+
+
+def _encode_value(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    if isinstance(value, (bool, np.bool_)):
+        return "true" if value else "false"
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating, Decimal)):
+        value = round(float(value), 2)
+        return str(int(value)) if value.is_integer() and abs(value) < 1e15 else f"{value:.2f}"
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="seconds")
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_rows(df: pd.DataFrame) -> list:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(
+        [_encode_value(v) for v in row] for row in df.itertuples(index=False, name=None)
+    )
+    return buf.getvalue().splitlines()
+
+
+def encode_result(columns, rows, token_budget: int = None) -> str:
+    """
+    Compact, typed text for a query result in a prompt: one `name:type` CSV
+    header, then rows with numbers rounded to 2 dp and ISO dates. A result
+    over the budget becomes the summarize_dataframe digest plus as many
+    leading rows as still fit, so the prompt size stays bounded.
+    """
+    token_budget = token_budget or CHAT_RESULT_TOKEN_BUDGET
+    if not rows:
+        return "(no rows)"
+    df = result_frame(columns, rows)
+    header = ",".join(f"{c}:{_value_type(df[c])}" for c in df.columns)
+    lines = _encode_rows(df)
+    encoded = "\n".join([header] + lines)
+
+    if estimate_tokens(encoded) > token_budget:
+        digest = summarize_dataframe(df, token_budget // 2)
+        budget_chars = token_budget * CHARS_PER_TOKEN - len(digest) - len(header) - 40
+        sample = []
+        for line in lines:
+            budget_chars -= len(line) + 1
+            if budget_chars < 0:
+                break
+            sample.append(line)
+        encoded = "\n".join([digest, f"first {len(sample)} of {len(df)} rows:", header] + sample)
+
+    logger.info(
+        "Chat result: %d rows, ~%d -> ~%d tokens",
+        len(rows), estimate_tokens(repr(rows)), estimate_tokens(encoded),
+    )
+    return encoded
+
+
+INSIGHT_MODEL = "gemma-3-27b-it"
+
+INSIGHT_TEMPLATE = """
         You are a business data analyst.
         Respond in 1–3 concise and consistent bullet points only.
         - Start each bullet with a bolded short label.
@@ -139,13 +1283,31 @@ def generate_insight(user_query: str, df: pd.DataFrame):
         {data}
     """
 
-    prompt = ChatPromptTemplate.from_template(template)
 
-    llm = ChatGoogleGenerativeAI(
-        model="gemma-3-27b-it",
-        google_api_key=os.getenv("GEMINI_API_KEY"),
-        temperature=0.1
-    )
+def insight_cache_key(user_query: str, df: pd.DataFrame) -> str:
+    prompt_hash = hashlib.sha256(
+        f"{INSIGHT_MODEL}\n{INSIGHT_TEMPLATE}\n{INSIGHT_TOKEN_BUDGET}\n{user_query}".encode()
+    ).hexdigest()
+    return f"{prompt_hash}:{hash_dataframe(df)}"
+
+
+def generate_insight(user_query: str, df: pd.DataFrame):
+    key = insight_cache_key(user_query, df)
+    cached = insight_cache.get(key)
+    if cached is not None:
+        return cached
+    return insight_flight.do(key, lambda: _generate_insight(key, user_query, df))
+
+
+def _generate_insight(key: str, user_query: str, df: pd.DataFrame):
+    # a call that finished just before this one joined the flight may have filled the cache
+    cached = insight_cache.get(key)
+    if cached is not None:
+        return cached
+
+    prompt = ChatPromptTemplate.from_template(INSIGHT_TEMPLATE)
+
+    llm = chat_llm(INSIGHT_MODEL, temperature=0.1)
 
     chain = (
         prompt
@@ -153,7 +1315,212 @@ def generate_insight(user_query: str, df: pd.DataFrame):
         | StrOutputParser()
     )
 
-    return chain.invoke({
+    insight = chain.invoke({
         "question": user_query,
-        "data": df.to_string(index=False) 
-    })
\ No newline at end of file
+        "data": prompt_data(df, user_query)
+    })
+    insight_cache.set(key, insight)
+    return insight
+
+
+# ============================================================================
+# BATCHED DASHBOARD INSIGHTS (one LLM round trip for every section)
+# ============================================================================
+INSIGHT_BATCH_TEMPLATE = """
+        You are a business data analyst writing short insights for several dashboard sections.
+        For EACH section below, write 1–3 concise and consistent bullet points:
+        - Start each bullet with a bolded short label.
+        - Give key business insights directly (no intro phrases).
+        - Suggest an action if useful.
+        No code or technical details.
+
+        Return ONLY a JSON object, no markdown fences. Use the exact section names as keys
+        and the bullet points of that section as a single string value (one bullet per line).
+
+        {sections}
+    """
+
+
+def parse_batch_insights(text: str, section_names) -> dict:
+    """Extract {section: insight} from the model's JSON answer; missing or invalid sections are left out."""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    parsed = {}
+    for name in section_names:
+        value = data.get(name)
+        if isinstance(value, list):
+            value = "\n".join(str(v) for v in value)
+        if isinstance(value, str) and value.strip():
+            parsed[name] = value.strip()
+    return parsed
+
+
+def _request_insight_batch(pending: dict) -> dict:
+    # sessions rendering the same sections over the same data share one LLM call
+    batch_key = hashlib.sha256("\n".join(
+        f"{name}={insight_cache_key(question, df)}" for name, (question, df) in sorted(pending.items())
+    ).encode()).hexdigest()
+    return insight_flight.do(batch_key, lambda: _call_insight_batch(pending))
+
+
+def _call_insight_batch(pending: dict) -> dict:
+    sections = "\n".join(
+        f"Section: {name}\nQuestion: {question}\nData:\n{prompt_data(df, name)}\n"
+        for name, (question, df) in pending.items()
+    )
+    prompt = ChatPromptTemplate.from_template(INSIGHT_BATCH_TEMPLATE)
+
+    llm = chat_llm(INSIGHT_MODEL, temperature=0.1)
+
+    chain = (
+        prompt
+        | llm
+        | StrOutputParser()
+    )
+
+    parsed = parse_batch_insights(chain.invoke({"sections": sections}), pending.keys())
+    for name, insight in parsed.items():
+        question, df = pending[name]
+        insight_cache.set(insight_cache_key(question, df), insight)
+    return parsed
+
+
+def _copy_future(source: Future, target: Future):
+    def _done(f: Future):
+        if f.exception() is not None:
+            target.set_exception(f.exception())
+        else:
+            target.set_result(f.result())
+    source.add_done_callback(_done)
+
+
+def _run_insight_batch(pending: dict, futures: dict):
+    try:
+        parsed = _request_insight_batch(pending)
+    except Exception as e:
+        for name in pending:
+            futures[name].set_exception(e)
+        return
+
+    missing = [name for name in pending if name not in parsed]
+    if missing:
+        logger.warning("Batch insight parse failed for %s; falling back to per-section calls.", missing)
+    for name, (question, df) in pending.items():
+        if name in parsed:
+            futures[name].set_result(parsed[name])
+        else:
+            _copy_future(INSIGHT_EXECUTOR.submit(generate_insight, question, df), futures[name])
+
+
+def submit_insights_batch(sections: dict) -> dict:
+    """
+    sections: {section_name: (question, df)}
+    Returns {section_name: Future}. Cached sections resolve immediately; the
+    rest are answered by a single LLM call on the worker pool.
+    """
+    futures, pending = {}, {}
+    for name, (question, df) in sections.items():
+        futures[name] = Future()
+        cached = insight_cache.get(insight_cache_key(question, df))
+        if cached is not None:
+            futures[name].set_result(cached)
+        else:
+            pending[name] = (question, df.copy())
+
+    if pending:
+        INSIGHT_EXECUTOR.submit(_run_insight_batch, pending, futures)
+    return futures
+
+
+# ============================================================================
+# DASHBOARD RENDER PROFILER (opt-in)
+# ============================================================================
+PROFILE_LOG = os.getenv("DASHBOARD_PROFILE_LOG", "logs/dashboard_profile.jsonl")
+PROFILE_SECTION_BUDGET_MS = float(os.getenv("DASHBOARD_SECTION_BUDGET_MS", 1500))
+
+
+def app_release() -> str:
+    release = os.getenv("APP_RELEASE")
+    if release:
+        return release
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=2
+        ).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+class RenderProfiler:
+    """
+    Times each dashboard section's query / transform / chart / insight phases.
+    When disabled every method is a cheap no-op, so pages can stay instrumented.
+    """
+
+    PHASES = ("query", "transform", "chart", "insight")
+
+    def __init__(self, enabled: bool, page: str):
+        self.enabled = enabled
+        self.page = page
+        self.timings = {}  # section -> {phase: ms}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, section: str, phase: str):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(section, phase, (time.perf_counter() - started) * 1000)
+
+    def record(self, section: str, phase: str, ms: float):
+        if self.enabled:
+            phases = self.timings.setdefault(section, {})
+            phases[phase] = phases.get(phase, 0.0) + ms
+
+    def to_frame(self) -> pd.DataFrame:
+        df = pd.DataFrame.from_dict(self.timings, orient="index").reindex(columns=list(self.PHASES)).fillna(0.0)
+        df["total"] = df.sum(axis=1)
+        df["over_budget"] = df["total"] > PROFILE_SECTION_BUDGET_MS
+        return df.round(1).rename_axis("section").reset_index()
+
+    def write_log(self, extra: dict = None):
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "page": self.page,
+            "release": app_release(),
+            "total_ms": round((time.perf_counter() - self._started) * 1000, 1),
+            "sections": {s: {p: round(ms, 1) for p, ms in phases.items()} for s, phases in self.timings.items()},
+            **(extra or {}),
+        }
+        os.makedirs(os.path.dirname(PROFILE_LOG) or ".", exist_ok=True)
+        with open(PROFILE_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+
+    def render(self, extra: dict = None):
+        """Show the collapsible timing panel and append this render to the JSONL log."""
+        if not self.enabled or not self.timings:
+            return
+        total_ms = (time.perf_counter() - self._started) * 1000
+        flights = single_flight_stats()
+        clients = llm_client_stats()
+        with st.expander(f"⏱️ Render profile — {total_ms:,.0f} ms total", expanded=False):
+            st.dataframe(self.to_frame(), hide_index=True, use_container_width=True)
+            st.caption("Process-wide single-flight (identical concurrent requests coalesced across sessions):")
+            st.dataframe(pd.DataFrame(flights), hide_index=True, use_container_width=True)
+            if clients:
+                st.caption("LLM clients (set up once per process, then reused):")
+                st.dataframe(pd.DataFrame(clients), hide_index=True, use_container_width=True)
+            st.caption(f"Section budget: {PROFILE_SECTION_BUDGET_MS:,.0f} ms. Logged to `{PROFILE_LOG}`.")
+        self.write_log({**(extra or {}), "single_flight": flights, "llm_clients": clients})
@@ -0,0 +1,253 @@
+"""
+Read-only JSON API over the KPI dashboard datasets.
+
+    python webapp/dashboard_api.py            # http://127.0.0.1:8001
+
+    GET /api/dashboard/kpis?start_date=2025-01-01&end_date=2025-01-31
+    GET /api/dashboard/channels            ?start_date&end_date
+    GET /api/dashboard/revenue-trend       ?start_date&end_date&bucket=auto|day|week|month|quarter|year
+    GET /api/dashboard/top-products        ?start_date&end_date&limit=10   (+ an is_other "Others" row)
+    GET /api/dashboard/category-trend      ?start_date&end_date&bucket&top_n
+    GET /api/dashboard/inventory
+    GET /api/dashboard/inventory/categories
+    GET /api/dashboard/regions             ?start_date&end_date
+    GET /api/dashboard/export/<dataset>    ?start_date&end_date&format=csv|parquet
+
+Dates default to the last 30 days of wh.dim_date, like the dashboard.
+SQL comes from dashboard_queries, so the numbers match the Streamlit page.
+
+Every response carries an ETag and Last-Modified derived from the data
+version: the last successful ETL run in wh.etl_runs (plus, for inventory,
+the latest in-place POS update of wh.current_inventory). A matching
+If-None-Match / If-Modified-Since gets a 304 before any dataset query runs.
+Exports (see exports.DATASETS) are streamed from a server-side cursor instead.
+"""
+import hashlib
+import os, sys, time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+from dotenv import load_dotenv
+from flask import Flask, Response, jsonify, request, make_response
+from flask_cors import CORS
+from psycopg2.pool import ThreadedConnectionPool
+
+# ---------- ENV ----------
+BASE_DIR = Path(__file__).resolve().parent.parent  # repo root
+DOTENV_PATH = BASE_DIR / "config" / ".env"
+if DOTENV_PATH.exists():
+    load_dotenv(DOTENV_PATH)
+else:
+    load_dotenv(BASE_DIR / ".env")
+
+sys.path.insert(0, str(BASE_DIR))
+import dashboard_queries as dq  # noqa: E402
+import exports  # noqa: E402
+
+# ---------- DB POOL (read-only sessions) ----------
+DB_KW = dict(
+    host=os.getenv("DB_HOST"),
+    port=os.getenv("DB_PORT", "6543"),
+    dbname=os.getenv("DB_NAME", "postgres"),
+    user=os.getenv("DB_USER"),
+    password=os.getenv("DB_PASSWORD"),
+    sslmode=os.getenv("DB_SSLMODE", "require"),
+)
+_missing = [k for k, v in DB_KW.items() if v in (None, "")]
+if _missing:
+    raise RuntimeError(f"Missing DB env values for: {', '.join(_missing)}. Check {DOTENV_PATH}")
+
+pool = ThreadedConnectionPool(1, int(os.getenv("DASHBOARD_API_POOL_SIZE", 8)), **DB_KW)
+
+# The data version is re-read at most this often, so a burst of polls costs one tiny query.
+VERSION_TTL_SECONDS = float(os.getenv("DASHBOARD_API_VERSION_TTL", 5))
+
+def get_conn():
+    conn = pool.getconn()
+    if not conn.readonly:
+        conn.set_session(readonly=True, autocommit=True)
+    return conn
+
+def put_conn(conn):
+    if conn: pool.putconn(conn)
+
+# ---------- Helpers ----------
+def _jsonable(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def run_query(sql: str, params=None):
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            cols = [c.name for c in cur.description]
+            rows = [dict(zip(cols, map(_jsonable, r))) for r in cur.fetchall()]
+            return cols, rows
+    finally:
+        put_conn(conn)
+
+_version_cache = {}
+
+def data_version(include_inventory: bool = False) -> datetime:
+    """Finish time of the last successful ETL run (or the latest POS inventory update, if newer)."""
+    cached = _version_cache.get(include_inventory)
+    if cached and time.monotonic() - cached[0] < VERSION_TTL_SECONDS:
+        return cached[1]
+
+    sql = "SELECT MAX(finished_at) FROM wh.etl_runs WHERE status = 'success'"
+    if include_inventory:
+        sql = f"SELECT GREATEST(({sql}), (SELECT MAX(updated_at) FROM wh.current_inventory))"
+    _, rows = run_query(sql)
+    version = next(iter(rows[0].values()))
+    version = datetime.fromisoformat(version) if version else datetime(1970, 1, 1, tzinfo=timezone.utc)
+    version = version.astimezone(timezone.utc).replace(microsecond=0)  # HTTP dates have 1s resolution
+    _version_cache[include_inventory] = (time.monotonic(), version)
+    return version
+
+def date_params():
+    start = request.args.get("start_date")
+    end = request.args.get("end_date")
+    if not (start and end):
+        _, rows = run_query("SELECT MIN(date_key) AS min_date, MAX(date_key) AS max_date FROM wh.dim_date")
+        min_date = date.fromisoformat(rows[0]["min_date"])
+        max_date = date.fromisoformat(rows[0]["max_date"])
+        end = end or max_date.isoformat()
+        start = start or max(min_date, date.fromisoformat(end) - timedelta(days=30)).isoformat()
+    return {"start_date": date.fromisoformat(start), "end_date": date.fromisoformat(end)}
+
+def bucket_param(params: dict) -> str:
+    bucket = (request.args.get("bucket") or "auto").lower()
+    if bucket == "auto":
+        return dq.pick_time_bucket(params["start_date"], params["end_date"])
+    return bucket
+
+def cached_dataset(name: str, build, include_inventory: bool = False):
+    """
+    Serves one dataset with validators. build() returns (sql, params, meta) and
+    is only called when the client's cached copy is stale.
+    """
+    version = data_version(include_inventory)
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.args.items()))
+    etag = hashlib.sha1(f"{name}?{query}@{version.isoformat()}".encode()).hexdigest()
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = request.if_modified_since is not None and request.if_modified_since >= version
+    if not_modified:
+        resp = make_response("", 304)
+    else:
+        sql, params, meta = build()
+        cols, rows = run_query(sql, params)
+        resp = jsonify({
+            "dataset": name,
+            **{k: _jsonable(v) for k, v in meta.items()},
+            "data_version": version.isoformat(),
+            "columns": cols,
+            "rows": rows,
+        })
+    resp.set_etag(etag)
+    resp.last_modified = version
+    resp.headers["Cache-Control"] = "no-cache"  # always revalidate; revalidation is cheap
+    return resp
+
+# ---------- APP ----------
+app = Flask(__name__)
+CORS(app)
+
+@app.errorhandler(ValueError)
+def bad_request(e):
+    return jsonify({"error": str(e)}), 400
+
+@app.get("/api/dashboard/health")
+def api_health():
+    return jsonify({"ok": True, "data_version": data_version().isoformat()})
+
+@app.get("/api/dashboard/kpis")
+def api_kpis():
+    def build():
+        params = date_params()
+        return (*dq.kpis(params), params)
+    return cached_dataset("kpis", build)
+
+@app.get("/api/dashboard/channels")
+def api_channels():
+    def build():
+        params = date_params()
+        return (*dq.channel_revenue(params), params)
+    return cached_dataset("channels", build)
+
+@app.get("/api/dashboard/revenue-trend")
+def api_revenue_trend():
+    def build():
+        params = date_params()
+        bucket = bucket_param(params)
+        return (*dq.revenue_trend(params, bucket), {**params, "bucket": bucket})
+    return cached_dataset("revenue-trend", build)
+
+@app.get("/api/dashboard/top-products")
+def api_top_products():
+    def build():
+        params = date_params()
+        limit = int(request.args.get("limit", dq.TOP_N))
+        sql, sql_params = dq.top_n_sales("product", params, top_n=limit)
+        return sql, sql_params, {**params, "limit": limit}
+    return cached_dataset("top-products", build)
+
+@app.get("/api/dashboard/category-trend")
+def api_category_trend():
+    def build():
+        params = date_params()
+        bucket = bucket_param(params)
+        top_n = int(request.args.get("top_n", dq.TOP_N))
+        sql, sql_params = dq.top_n_daily_sales("category", params, top_n=top_n, bucket=bucket)
+        return sql, sql_params, {**params, "bucket": bucket, "top_n": top_n}
+    return cached_dataset("category-trend", build)
+
+@app.get("/api/dashboard/inventory")
+def api_inventory():
+    return cached_dataset("inventory", lambda: (*dq.inventory_health(), {}), include_inventory=True)
+
+@app.get("/api/dashboard/inventory/categories")
+def api_inventory_categories():
+    return cached_dataset("inventory-categories", lambda: (*dq.inventory_by_category(), {}), include_inventory=True)
+
+@app.get("/api/dashboard/regions")
+def api_regions():
+    def build():
+        params = date_params()
+        return (*dq.region_sales(params), params)
+    return cached_dataset("regions", build)
+
+@app.get("/api/dashboard/export/<dataset>")
+def api_export(dataset):
+    fmt = (request.args.get("format") or "csv").lower()
+    params = date_params()
+    conn = get_conn()
+    try:
+        chunks = exports.iter_export(conn, dataset, params, fmt)
+    except Exception:
+        put_conn(conn)
+        raise
+
+    def generate():
+        # the connection stays checked out until the last chunk is sent (or the client goes away)
+        try:
+            yield from chunks
+        finally:
+            put_conn(conn)
+
+    filename = f"{dataset}_{params['start_date']}_{params['end_date']}.{fmt}"
+    return Response(
+        generate(),
+        mimetype=exports.FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+if __name__ == "__main__":
+    app.run(host="127.0.0.1", port=int(os.getenv("DASHBOARD_API_PORT", 8001)), debug=True)
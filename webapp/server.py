@@ -575,6 +575,33 @@ def api_create_receipt():
                         inv_rows
                     )
 
+                # ----- warehouse current inventory (optional; created by mapping.py)
+                # Decrement in place so the dashboard's stock levels stay live between ETL runs.
+                if table_exists("wh", "current_inventory"):
+                    # several POS products can share one master product, so sum per product_sk
+                    execute_values(
+                        cur,
+                        """
+                        UPDATE wh.current_inventory ci
+                        SET stock_qty        = ci.stock_qty - s.qty,
+                            days_of_cover    = CASE WHEN ci.avg_daily_sold > 0
+                                                    THEN (ci.stock_qty - s.qty) / ci.avg_daily_sold END,
+                            last_movement_at = GREATEST(ci.last_movement_at, s.moved_at),
+                            updated_at       = now()
+                        FROM (
+                            SELECT b.product_sk, SUM(v.qty) AS qty, MAX(v.moved_at) AS moved_at
+                            FROM (VALUES %s) AS v(product_id, qty, moved_at)
+                            JOIN wh.bridge_product_source b
+                              ON b.source_channel = 'pos'
+                             AND b.source_product_id = v.product_id
+                            GROUP BY b.product_sk
+                        ) s
+                        WHERE ci.product_sk = s.product_sk
+                        """,
+                        [(i["product_id"], int(i["qty"]), sold_at) for i in items],
+                        template="(%s, %s::numeric, %s::timestamptz)"
+                    )
+
                 # ----- payment (optional; table name assumed "payments")
                 if table_exists("src_pos", "payments"):
                     # discover available columns